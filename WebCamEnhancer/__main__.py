@@ -1,3 +1,11 @@
+import sys
+
+# `python -m WebCamEnhancer --import-report` prints slowest imports when window is ready
+IMPORT_REPORT = "--import-report" in sys.argv
+if IMPORT_REPORT:
+    from WebCamEnhancer.core.profiling import ImportTimer
+    import_timer = ImportTimer().install()
+
 from WebCamEnhancer.core.utils import configure_logging, init_gettext
 import logging
 from WebCamEnhancer.constants import LOGGING_FILE
@@ -5,16 +13,25 @@ from WebCamEnhancer.constants import LOGGING_FILE
 init_gettext()
 configure_logging(LOGGING_FILE, logging.INFO)
 
+# filters, middleware and drivers are imported when activated (see core/registry.py)
 from WebCamEnhancer.config import Configuration
-import WebCamEnhancer.modules.middleware
-import WebCamEnhancer.modules.filters
 
 from WebCamEnhancer.gui.controler import Controler
 from WebCamEnhancer.gui.settings import Setting
 
 
-Configuration.load_config()
-init_gettext(Configuration.get_custom_config(Setting)["language"])
-control = Controler()
-control.run()
-Configuration.save_config()
\ No newline at end of file
+def run():
+    Configuration.load_config()
+    init_gettext(Configuration.get_custom_config(Setting)["language"])
+    control = Controler()
+    if IMPORT_REPORT:
+        import_timer.uninstall()
+        control.root.update()
+        print(import_timer.report())
+    control.run()
+    Configuration.save_config()
+
+
+# worker processes of ProcessWorker import this module again
+if __name__ == "__main__":
+    run()
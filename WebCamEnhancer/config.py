@@ -1,15 +1,14 @@
 from typing import Optional
 
-import cv2, json
+import cv2, json, shutil
 from pathlib import Path
 from collections import UserDict
 from copy import deepcopy
 from threading import Lock
 from mergedeep import  merge
-import distutils.dir_util
 
 from .constants import CONFIG_DIR, BASE_CONFIG, PICTURES_DIR, FALLBACK_PICTURES_DIR
-from .core.base import ModuleController
+from .core.registry import GROUPS, PLUGINS, PluginDescriptor
 
 class ConfigEncoder(json.JSONEncoder):
     "Encodes ConfigGroups and Paths to JSON."
@@ -44,6 +43,14 @@ class ConfigGroup(UserDict):
         with self._lock:
             self.data[key] = value
 
+    def __getstate__(self):
+        # pickled for worker processes, lock isn't shared
+        return self.data
+
+    def __setstate__(self, data):
+        self.data = data
+        self._lock = Lock()
+
 def config_decoder(obj: dict) -> ConfigGroup:
     "Cast ConfigGroups and relative Paths sets absolute from config directory."
     for key, value in obj.items():
@@ -62,11 +69,12 @@ class Config(ConfigGroup):
 
     def generate_default(self) -> dict:
         template = {}
-        for group_name, modules in ModuleController.MODULES.items():
+        for group_name in GROUPS:
             template[group_name] = {}
-            for module in modules:
+            # from descriptors, so plugin modules don't need to be imported
+            for module in PLUGINS.descriptors(group_name):
                 if module.CONFIG_TEMPLATE:
-                    template[group_name][module.__name__] = config_decoder(deepcopy(module.CONFIG_TEMPLATE))
+                    template[group_name][module.name] = config_decoder(deepcopy(module.CONFIG_TEMPLATE))
         for klass in Configuration.CUSTOM_CLASSES:
             if hasattr(klass, "CONFIG_TEMPLATE"):
                 template[klass.__name__] = config_decoder(deepcopy(klass.CONFIG_TEMPLATE))
@@ -76,12 +84,15 @@ class Config(ConfigGroup):
         return self.get(klass.__name__, {})
 
     def get_module_config(self, klass) -> dict: 
+        "Config of plugin class or PluginDescriptor."
+        if isinstance(klass, PluginDescriptor):
+            return self[klass.group].get(klass.name, {})
         group = self[klass.__mro__[1].__name__]
         return group.get(klass.__name__, {})
 
     def _make_user_setting(self):
         CONFIG_DIR.mkdir(parents=True, exist_ok=True)
-        distutils.dir_util.copy_tree(str(FALLBACK_PICTURES_DIR), str(PICTURES_DIR))
+        shutil.copytree(FALLBACK_PICTURES_DIR, PICTURES_DIR, dirs_exist_ok=True)
 
     def load_config(self, path: Optional[Path] = None) -> None:
         defaults = self.generate_default()
@@ -13,6 +13,7 @@ CONFIG_DIR = Path(user_data_dir(APP_NAME, APP_AUTHOR_SHORT))
 BASE_CONFIG = CONFIG_DIR / "config.json"
 LOGGING_FILE = CONFIG_DIR / "log.log"
 PICTURES_DIR = CONFIG_DIR / "img"
+JIT_CACHE_DIR = CONFIG_DIR / "jit_cache"
 FALLBACK_PICTURES_DIR = Path(__file__).parent / "img"
 TRANSLATIONS_DIR = Path(__file__).parent / "locales"
 
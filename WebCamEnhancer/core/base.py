@@ -1,7 +1,59 @@
+import cv2, threading
 from pathlib import Path
-import matplotlib.colors
 import numpy as np
 
+from .profiling import NULL_TRACER
+from .utils import logger
+
+
+def _half(frame, dst=None):
+    return cv2.resize(frame, (frame.shape[1]//2, frame.shape[0]//2), dst=dst, interpolation=cv2.INTER_AREA)
+
+
+class FrameViews:
+    """
+    Representations of captured frame computed lazily, at most once per frame,
+    and shared by middleware and filters. Views are read-only for their users.
+
+    `alias` is another array with the same content (the frame filters start with).
+    Frames other than the captured frame or alias are converted without caching.
+    """
+
+    CONVERSIONS = {
+        "gray": lambda frame, dst=None: cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY, dst=dst),
+        "rgb": lambda frame, dst=None: cv2.cvtColor(frame, cv2.COLOR_BGR2RGB, dst=dst),
+        "hsv": lambda frame, dst=None: cv2.cvtColor(frame, cv2.COLOR_BGR2HSV, dst=dst),
+        "half": _half
+    }
+
+    def __init__(self, frame=None, index=None):
+        self._lock = threading.Lock()
+        self._views = {}
+        # arrays of previous frame reused as destination
+        self._buffers = {}
+        self.set_frame(frame, index)
+
+    def set_frame(self, frame, index=None, alias=None):
+        "Invalidates views of previous frame."
+        with self._lock:
+            self.frame = frame
+            self.index = index
+            self.alias = alias
+            self._buffers.update(self._views)
+            self._views = {}
+
+    def get(self, name: str, frame=None, dst=None):
+        "View `name` of captured frame (or of `frame`, converted into `dst`)."
+        if frame is not None and frame is not self.frame and frame is not self.alias:
+            return self.CONVERSIONS[name](frame, dst)
+        with self._lock:
+            view = self._views.get(name)
+            if view is None:
+                view = self._views[name] = self.CONVERSIONS[name](self.frame, self._buffers.pop(name, None))
+        return view
+
+    __getitem__ = get
+
 
 class ModuleController:
     """Collector for all behaviours of application. Like Filters, Middleware, Drivers."""
@@ -29,23 +81,38 @@ class ModuleController:
         if Path(value).exists():
             return str(value)
         else:
-            fallback = Path(__file__).parent/self.CONFIG_TEMPLATE[key]
+            fallback = Path(__file__).parent.parent/self.CONFIG_TEMPLATE[key]
             if not fallback.exists():
                 raise ValueError(f"Fallback file '{self.CONFIG_TEMPLATE[key]}' not found in package.")
             return str(fallback)
 
     @staticmethod
     def hex2color(color_hex: str):
+        # matplotlib is slow to import, only few filters need it
+        import matplotlib.colors
         return np.asarray(np.array(matplotlib.colors.to_rgb(color_hex))*255., np.uint8)
 
 
 class Filter(ModuleController):
     """Apply specific operation to camera frame."""
 
+    # Names of middleware used by the filter, prepared when filter gets active
+    REQUIRES = ()
+
+    # When True, apply() has signature apply(frame, out=None) and writes result to `out`
+    # (same shape as frame, can be the frame itself) instead of allocating new array.
+    # `frame` is never modified unless `out` is the frame.
+    IN_PLACE = False
+
+    # (x, y, w, h) of the part of frame given to apply() when filter runs on region only
+    region = None
+
     def __init__(self, config, middleware, worker):
         super().__init__(config)
         self.middleware = middleware
         self.worker = worker
+        self._ready = threading.Event()
+        self._ready.set()
 
     def prepare(self, resolution):
         pass
@@ -53,14 +120,87 @@ class Filter(ModuleController):
     def apply(self, frame):
         raise NotImplemented
 
+    def release(self):
+        "Frees resources (threads, files) of prepare() when worker stops."
+        pass
+
+    def static_output(self) -> bool:
+        """
+        True when output of apply() doesn't depend on input frames and doesn't change.
+        Worker then applies the filter once and sends the result again while it is the last filter.
+        """
+        return False
+
+    def warm_up(self, frame):
+        """
+        Slow first-time work of apply() (JIT compilation, loading) done on black `frame`
+        of target resolution. Runs in background thread after prepare().
+        """
+        pass
+
+    @property
+    def ready(self) -> bool:
+        "False while warming up. CamerasWorker passes frames through filter which is not ready."
+        return self._ready.is_set()
+
+    def start_warm_up(self, resolution):
+        "Warms up filter and middleware it requires in background thread."
+        middleware = [self.middleware[name] for name in self.REQUIRES]
+        if type(self).warm_up is Filter.warm_up and all(type(m).warm_up is Middleware.warm_up for m in middleware):
+            return
+        self._ready.clear()
+
+        def run():
+            frame = np.zeros((resolution[1], resolution[0], 3), np.uint8)
+            try:
+                for mdl in middleware:
+                    with mdl._lock:
+                        mdl.warm_up(frame)
+                self.warm_up(frame)
+            except Exception as e:
+                logger.warning("Warm-up of '%s' failed: %s", self.__class__.__name__, e)
+            finally:
+                self._ready.set()
+                logger.debug("Filter '%s' warmed up.", self.__class__.__name__)
+        threading.Thread(target=run, name=f"warm-up {self.__class__.__name__}", daemon=True).start()
+
+    def crop(self, array):
+        "Part of full frame sized `array` (mask, background...) matching frame given to apply()."
+        if self.region is None:
+            return array
+        x, y, w, h = self.region
+        return array[y:y+h, x:x+w]
+
+    def view(self, name: str, frame, dst=None):
+        "Derived view of frame (see FrameViews) shared with other stages if frame was not changed yet."
+        return self.worker.views.get(name, frame, dst)
+
+    def color_transform(self):
+        """
+        Per-pixel color mapping of this filter (Affine, LUT1D or LUT3D from core.color) or None.
+        Consecutive filters with color transform are fused by CamerasWorker into one pass.
+        """
+        return None
+
 class Middleware(ModuleController):
     """ Apply resusable operation to the camera frame."""
 
+    tracer = NULL_TRACER
+
     def __init__(self, config):
         super().__init__(config)
         self._done = False
         self._frame = None
+        self._index = None
+        self._views = None
         self._result = None
+        # FrameViews of frame being computed, use in apply() like self.views["gray"]
+        self.views = None
+        # index of frame which last result of get() belongs to
+        self.result_index = None
+        # MiddlewarePipeline computing results ahead on own thread (if pipelined)
+        self.pipeline = None
+        self._lock = threading.Lock()
 
     def prepare(self, resolution):
         pass
@@ -68,6 +208,16 @@ class Middleware(ModuleController):
     def apply(self, frame):
         raise NotImplemented
 
+    def warm_up(self, frame):
+        "Slow first-time work of apply() (loading models) on black frame. Called from background thread."
+        pass
+
+    def compute(self, frame, views=None):
+        "Thread safe apply()."
+        with self._lock, self.tracer.span(self.__class__.__name__, "middleware", triggered_by=self.tracer.current):
+            self.views = views if views is not None else FrameViews(frame)
+            return self.apply(frame)
+
     def get(self):
         "Used by other classes to collect result of operation."
         if self._done:
@@ -75,24 +225,48 @@ class Middleware(ModuleController):
         else:
             if self._frame is None:
                 raise ValueError("self.frame is None. Probably set_frame() was never called.")
-            self._result = self.apply(self._frame)
+            if self.pipeline is not None:
+                self._result, self.result_index = self.pipeline.latest(self)
+            else:
+                self._result, self.result_index = self.compute(self._frame, self._views), self._index
             self._done = True
         return self._result
 
-    def set_frame(self, frame):
+    def peek(self):
+        "(result, result_index) if get() already ran for current frame, None otherwise. Never computes."
+        if self._done:
+            return self._result, self.result_index
+        return None
+
+    def set_frame(self, frame, index=None, views=None):
         self._frame = frame
+        self._index = index
+        self._views = views
         self._done = False
 
 class Driver(ModuleController):
     """Implements behaviour based on state and middleware of Application."""
 
+    # Names of middleware used by the driver
+    REQUIRES = ()
+
+    # resolve() calls per second
+    TICK_RATE = 10.
+
     def __init__(self, config, middleware, camera_worker):
         super().__init__(config)
         self.middleware = middleware
         self.worker = camera_worker
+        # can be changed by prepare()
+        self.requires = tuple(self.REQUIRES)
+        self.tick_rate = self.TICK_RATE
 
     def prepare(self):
         pass
 
-    def resolve(self):
+    def resolve(self, snapshot):
+        """
+        Called `tick_rate` times a second on scheduler thread with Snapshot of latest
+        processed frame. Results of middleware in `requires` are in snapshot.results.
+        """
         raise NotImplemented
\ No newline at end of file
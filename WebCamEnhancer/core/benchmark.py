@@ -0,0 +1,326 @@
+"""
+Benchmark of filters and middleware on synthetic frames with golden output checks.
+
+    $ python -m WebCamEnhancer.core.benchmark --output results.json --compare previous.json
+    $ python -m WebCamEnhancer.core.benchmark --check-golden tests/golden
+"""
+import cv2, json, time, platform, argparse, tracemalloc
+import numpy as np
+from copy import deepcopy
+from pathlib import Path
+from typing import Optional
+
+from ..constants import APP_VERSION
+from ..config import config_decoder
+from .base import FrameViews
+from .registry import PLUGINS
+from .sources import SyntheticSource
+from .utils import logger, blend, draw_on_image, Sprite
+
+RESOLUTIONS = ((640, 480), (1280, 720), (1920, 1080))
+GOLDEN_RESOLUTION = (640, 480)
+GOLDEN_FRAMES = 3
+# Filters with output depending on time can't be compared
+GOLDEN_SKIP = {"Info": "renders measured FPS"}
+# Mean absolute difference and share of pixels off by more than PIXEL_TOLERANCE allowed
+MEAN_TOLERANCE = 1.5
+PIXEL_TOLERANCE = 24
+PIXEL_SHARE_TOLERANCE = 0.01
+
+def load_plugins(group: str) -> list:
+    "Classes of registered plugins. Missing optional dependencies are only logged."
+    classes = []
+    for descriptor in PLUGINS.descriptors(group):
+        try:
+            classes.append(descriptor.load())
+        except Exception as e:
+            logger.warning("Unable to import %s: %s", descriptor, e)
+    return classes
+
+
+class ReferenceMiddleware:
+    "Stand-in for middleware returning ground truth of SyntheticSource, so filters are deterministic."
+
+    def __init__(self, source: SyntheticSource, key: str):
+        self.source = source
+        self.key = key
+        self.index = 0
+        self._truth = {}
+
+    def set_frame(self, frame, index: Optional[int] = None):
+        self.index = index if index is not None else self.index + 1
+        if self.index not in self._truth:
+            self._truth[self.index] = self.source.truth(self.index)[self.key]
+
+    @property
+    def result_index(self):
+        return self.index
+
+    def get(self):
+        return self._truth[self.index]
+
+
+class BenchWorker:
+    "Minimal CamerasWorker replacement with attributes used by filters."
+
+    def __init__(self, resolution, active_filters=()):
+        self.resolution = resolution
+        self._active_filters = tuple(active_filters)
+        self.input_cam_properties = {"width": resolution[0], "height": resolution[1], "fps": 30.}
+        self.output_cam_properties = self.input_cam_properties
+        self.views = FrameViews()
+
+    @property
+    def filters(self):
+        return self._active_filters
+
+
+class Harness:
+    "Prepared filters with reference middleware fed by SyntheticSource."
+
+    def __init__(self, resolution, frames: int = 8):
+        self.resolution = tuple(resolution)
+        self.source = SyntheticSource(*self.resolution)
+        self.source.open()
+        self.frames = [self.source.render(i) for i in range(frames)]
+        self.middleware = {
+            "Selfie": ReferenceMiddleware(self.source, "mask"),
+            "Cascade": ReferenceMiddleware(self.source, "faces")
+        }
+        self.worker = BenchWorker(self.resolution)
+
+    def set_frame(self, index: int) -> np.array:
+        "Returns working copy of frame `index` and sets middleware."
+        frame = self.frames[index % len(self.frames)]
+        for m in self.middleware.values():
+            m.set_frame(frame, index % len(self.frames))
+        working = frame.copy()
+        self.worker.views.set_frame(frame, index, alias=working)
+        return working
+
+    def make_filter(self, klass):
+        flt = klass(config_decoder(deepcopy(klass.CONFIG_TEMPLATE)), self.middleware, self.worker)
+        self.worker._active_filters = (klass.__name__,)
+        flt.prepare(self.resolution)
+        return flt
+
+    @staticmethod
+    def apply(flt, frame: np.array) -> np.array:
+        "Applies filter the way CamerasWorker does."
+        return flt.apply(frame, out=frame) if flt.IN_PLACE else flt.apply(frame)
+
+    def make_middleware(self, klass):
+        mdl = klass(config_decoder(deepcopy(klass.CONFIG_TEMPLATE)))
+        mdl.prepare(self.resolution)
+        return mdl
+
+
+def _measure(setup, step, frames: int, warmup: int) -> dict:
+    """
+    Runs step(setup(i)) and collects latency of step and its peak numpy allocations per frame.
+    Allocations made inside OpenCV are not visible.
+    """
+    for i in range(warmup):
+        step(setup(i))
+    latencies = np.empty(frames)
+    for i in range(frames):
+        data = setup(i)
+        start = time.perf_counter()
+        step(data)
+        latencies[i] = time.perf_counter() - start
+
+    allocated = []
+    tracemalloc.start()
+    try:
+        for i in range(min(frames, 5)):
+            data = setup(i)
+            tracemalloc.reset_peak()
+            before = tracemalloc.get_traced_memory()[0]
+            step(data)
+            allocated.append(tracemalloc.get_traced_memory()[1] - before)
+            del data
+    finally:
+        tracemalloc.stop()
+    return {
+        "fps": frames / latencies.sum(),
+        "p50_ms": float(np.percentile(latencies, 50) * 1e3),
+        "p99_ms": float(np.percentile(latencies, 99) * 1e3),
+        "alloc_bytes": int(np.median(allocated))
+    }
+
+
+def bench_filter(klass, resolution, frames: int = 50, warmup: int = 5) -> dict:
+    harness = Harness(resolution)
+    flt = harness.make_filter(klass)
+    return _measure(harness.set_frame, lambda frame: harness.apply(flt, frame), frames, warmup)
+
+
+def bench_middleware(klass, resolution, frames: int = 50, warmup: int = 5) -> dict:
+    harness = Harness(resolution)
+    mdl = harness.make_middleware(klass)
+    def setup(i):
+        mdl.set_frame(harness.frames[i % len(harness.frames)])
+    return _measure(setup, lambda _: mdl.get(), frames, warmup)
+
+
+def _legacy_blend(foreground, background, alpha, out):
+    "Per-channel float64 blend used by filters before shared compositing."
+    for i in range(3):
+        out[:,:,i] = foreground[:,:,i]*alpha + background[:,:,i]*(1.-alpha)
+
+
+def _legacy_draw(bottom, top, center):
+    "Per-channel float64 overlay used by draw_on_image before shared compositing."
+    y, x = int(center[1] - top.shape[0]/2), int(center[0] - top.shape[1]/2)
+    alpha = top[:, :, 3] / 255.0
+    for c in range(3):
+        bottom[y:y+top.shape[0], x:x+top.shape[1], c] = (
+            alpha * top[:, :, c] + (1.0 - alpha) * bottom[y:y+top.shape[0], x:x+top.shape[1], c])
+
+
+def bench_compositing(resolution, frames: int = 50, warmup: int = 5) -> list[dict]:
+    "Full frame mask blend and sprite overlay, old per-channel loops against shared kernels."
+    harness = Harness(resolution)
+    background = harness.frames[-1]
+    sprite = cv2.imread(str(Path(__file__).parent.parent/"img/away.png"), cv2.IMREAD_UNCHANGED)
+    sprite = cv2.resize(sprite, None, fx=resolution[1]/1080., fy=resolution[1]/1080.)
+    prepared = Sprite(sprite)
+    center = (resolution[0]//2, resolution[1]//2)
+
+    def setup(i):
+        frame = harness.set_frame(i)
+        return frame, harness.middleware["Selfie"].get()
+    cases = {
+        "blend/legacy": lambda data: _legacy_blend(data[0], background, data[1], data[0]),
+        "blend": lambda data: blend(data[0], background, data[1], out=data[0]),
+        "overlay/legacy": lambda data: _legacy_draw(data[0], sprite, center),
+        "overlay/draw_on_image": lambda data: draw_on_image(data[0], sprite, center=center),
+        "overlay/Sprite": lambda data: prepared.draw(data[0], center=center),
+    }
+    return [{"group": "Compositing", "name": name, "resolution": "%dx%d" % tuple(resolution),
+             **_measure(setup, step, frames, warmup)} for name, step in cases.items()]
+
+
+def run(resolutions=RESOLUTIONS, frames: int = 50, only=None) -> dict:
+    results = []
+    for group, bench in (("Filter", bench_filter), ("Middleware", bench_middleware)):
+        for klass in load_plugins(group):
+            if only and klass.__name__ not in only:
+                continue
+            for resolution in resolutions:
+                item = {"group": group, "name": klass.__name__, "resolution": "%dx%d" % tuple(resolution)}
+                try:
+                    item.update(bench(klass, resolution, frames))
+                except Exception as e:
+                    item["error"] = f"{e.__class__.__name__}: {e}"
+                results.append(item)
+                logger.info("%s", item)
+    return {
+        "version": APP_VERSION,
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "opencv": cv2.__version__,
+        "machine": platform.machine(),
+        "results": results
+    }
+
+
+def compare(old: dict, new: dict) -> list[str]:
+    "Lines with fps change for each benchmark present in both results."
+    key = lambda r: (r["group"], r["name"], r["resolution"])
+    previous = {key(r): r for r in old["results"] if "fps" in r}
+    lines = []
+    for r in new["results"]:
+        if "fps" in r and key(r) in previous:
+            before = previous[key(r)]
+            lines.append("%-10s %-14s %-10s %8.1f -> %8.1f fps (%+.0f%%) p99 %6.2f -> %6.2f ms" % (
+                *key(r), before["fps"], r["fps"], (r["fps"] / before["fps"] - 1) * 100,
+                before["p99_ms"], r["p99_ms"]))
+    return lines
+
+
+def render_golden(klass, resolution=GOLDEN_RESOLUTION, frames: int = GOLDEN_FRAMES) -> np.array:
+    "Output of filter after processing first `frames` synthetic frames."
+    harness = Harness(resolution)
+    flt = harness.make_filter(klass)
+    for i in range(frames):
+        output = harness.apply(flt, harness.set_frame(i))
+    return output
+
+
+def golden_difference(expected: np.array, actual: np.array) -> dict:
+    if expected.shape != actual.shape:
+        return {"shape": (expected.shape, actual.shape), "ok": False}
+    diff = cv2.absdiff(expected, actual)
+    mean = float(diff.mean())
+    share = float((diff > PIXEL_TOLERANCE).any(axis=-1).mean()) if diff.ndim == 3 else float((diff > PIXEL_TOLERANCE).mean())
+    return {
+        "mean": mean,
+        "share": share,
+        "ok": mean <= MEAN_TOLERANCE and share <= PIXEL_SHARE_TOLERANCE
+    }
+
+
+def golden_filters():
+    return [k for k in load_plugins("Filter") if k.__name__ not in GOLDEN_SKIP]
+
+
+def update_golden(directory: Path):
+    directory.mkdir(parents=True, exist_ok=True)
+    for klass in golden_filters():
+        cv2.imwrite(str(directory / f"{klass.__name__}.png"), render_golden(klass))
+
+
+def check_golden(directory: Path) -> dict:
+    report = {}
+    for klass in golden_filters():
+        path = directory / f"{klass.__name__}.png"
+        if not path.exists():
+            report[klass.__name__] = {"ok": False, "missing": str(path)}
+            continue
+        report[klass.__name__] = golden_difference(cv2.imread(str(path), cv2.IMREAD_UNCHANGED), render_golden(klass))
+    return report
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description="Benchmark filters and middleware on synthetic frames.")
+    parser.add_argument("--resolutions", nargs="+", default=["%dx%d" % r for r in RESOLUTIONS])
+    parser.add_argument("--frames", type=int, default=50)
+    parser.add_argument("--only", nargs="+", help="Names of filters or middleware to run.")
+    parser.add_argument("--output", type=Path, help="Save results as JSON.")
+    parser.add_argument("--compare", type=Path, help="Compare with previously saved JSON.")
+    parser.add_argument("--compositing", action="store_true", help="Benchmark compositing kernels only.")
+    parser.add_argument("--update-golden", type=Path, metavar="DIR")
+    parser.add_argument("--check-golden", type=Path, metavar="DIR")
+    args = parser.parse_args(args)
+
+    if args.update_golden:
+        update_golden(args.update_golden)
+        return
+    if args.check_golden:
+        report = check_golden(args.check_golden)
+        for name, item in report.items():
+            print(f"{name:14} {'ok' if item['ok'] else 'FAILED'} {item}")
+        raise SystemExit(0 if all(item["ok"] for item in report.values()) else 1)
+
+    resolutions = [tuple(int(v) for v in r.split("x")) for r in args.resolutions]
+    if args.compositing:
+        results = {"results": [item for r in resolutions for item in bench_compositing(r, args.frames)]}
+    else:
+        results = run(resolutions, args.frames, args.only)
+    for r in results["results"]:
+        if "error" in r:
+            print("%-11s %-22s %-10s %s" % (r["group"], r["name"], r["resolution"], r["error"]))
+        else:
+            print("%-11s %-22s %-10s %8.1f fps  p50 %6.2f ms  p99 %6.2f ms  %10d B/frame" % (
+                r["group"], r["name"], r["resolution"], r["fps"], r["p50_ms"], r["p99_ms"], r["alloc_bytes"]))
+    if args.output:
+        with open(args.output, "w") as fh:
+            json.dump(results, fh, indent=4)
+    if args.compare:
+        with open(args.compare) as fh:
+            print("\n".join(compare(json.load(fh), results)))
+
+
+if __name__ == "__main__":
+    main()
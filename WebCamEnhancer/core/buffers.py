@@ -0,0 +1,148 @@
+import threading, queue
+import numpy as np
+from collections import deque
+
+
+class FrameQueue:
+    """
+    Bounded FIFO for frames shared between worker threads.
+
+    When full, behaviour depends on `policy`:
+      - "drop_oldest": discard the oldest queued item (keeps latency lowest),
+      - "drop_newest": discard the incoming item,
+      - "block": wait for free space (up to `timeout` of put(), then drop the incoming item).
+
+    Counts dropped items and the highest number of items ever queued.
+    `on_drop` is called with every dropped item (e.g. to release its buffer).
+    """
+
+    POLICIES = ("drop_oldest", "drop_newest", "block")
+
+    def __init__(self, maxsize: int = 2, policy: str = "drop_oldest", on_drop=None):
+        if policy not in self.POLICIES:
+            raise ValueError(f"Unknown queue policy '{policy}'. Use one of: {', '.join(self.POLICIES)}.")
+        if maxsize < 1:
+            raise ValueError("Queue size must be at least 1.")
+        self.maxsize = int(maxsize)
+        self.policy = policy
+        self.on_drop = on_drop
+        self.dropped = 0
+        self.high_water = 0
+        self._items = deque()
+        self._lock = threading.Lock()
+        self._not_empty = threading.Condition(self._lock)
+        self._not_full = threading.Condition(self._lock)
+
+    def __len__(self):
+        with self._lock:
+            return len(self._items)
+
+    def put(self, item, timeout: float = None) -> bool:
+        "Puts item to the queue. Returns False if incoming item was dropped."
+        dropped = []
+        with self._lock:
+            if len(self._items) >= self.maxsize:
+                if self.policy == "drop_newest":
+                    dropped.append(item)
+                elif self.policy == "drop_oldest":
+                    dropped.append(self._items.popleft())
+                elif not self._not_full.wait_for(lambda: len(self._items) < self.maxsize, timeout):
+                    dropped.append(item)
+            added = not dropped or self.policy == "drop_oldest"
+            if added:
+                self._items.append(item)
+                self.high_water = max(self.high_water, len(self._items))
+                self._not_empty.notify()
+            self.dropped += len(dropped)
+        if self.on_drop is not None:
+            for old in dropped:
+                self.on_drop(old)
+        return added
+
+    def get(self, block: bool = True, timeout: float = None):
+        "Gets oldest item. Raises queue.Empty like queue.Queue."
+        with self._lock:
+            if not block:
+                if not self._items:
+                    raise queue.Empty
+            elif not self._not_empty.wait_for(lambda: self._items, timeout):
+                raise queue.Empty
+            item = self._items.popleft()
+            self._not_full.notify()
+            return item
+
+    def clear(self):
+        with self._lock:
+            items = list(self._items)
+            self._items.clear()
+            self._not_full.notify_all()
+        if self.on_drop is not None:
+            for item in items:
+                self.on_drop(item)
+
+    @property
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "size": len(self._items),
+                "maxsize": self.maxsize,
+                "policy": self.policy,
+                "dropped": self.dropped,
+                "high_water": self.high_water
+            }
+
+
+class FramePool:
+    """
+    Preallocated frames of one shape. Used in one of two ways:
+      - next() hands buffers out in turn, buffer is reused after `count` calls, so `count`
+        must be larger than number of frames which can be alive at once,
+      - acquire() hands out buffer which is not in use (allocating new one when all are)
+        and release() returns it when its last user is done with it.
+    """
+
+    def __init__(self, shape: tuple, count: int, dtype=np.uint8):
+        self.shape = tuple(shape)
+        self.dtype = dtype
+        self._buffers = [np.empty(self.shape, dtype) for _ in range(count)]
+        self._index = 0
+        self._free = list(self._buffers)
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._buffers)
+
+    def next(self) -> np.array:
+        buffer = self._buffers[self._index]
+        self._index = (self._index + 1) % len(self._buffers)
+        return buffer
+
+    def acquire(self) -> np.array:
+        "Buffer not used by anybody until release()."
+        with self._lock:
+            if self._free:
+                return self._free.pop()
+            buffer = np.empty(self.shape, self.dtype)
+            self._buffers.append(buffer)
+            return buffer
+
+    def release(self, frame: np.array):
+        "Returns acquired buffer. Other arrays and buffers already free are ignored."
+        with self._lock:
+            if self.owns(frame) and not any(frame is b for b in self._free):
+                self._free.append(frame)
+
+    @property
+    def in_use(self) -> int:
+        return len(self._buffers) - len(self._free)
+
+    def copy(self, frame: np.array) -> np.array:
+        "Copies frame into next buffer. Allocates if shape doesn't match."
+        if frame.shape != self.shape:
+            return frame.copy()
+        buffer = self.next()
+        np.copyto(buffer, frame)
+        return buffer
+
+    def owns(self, frame: np.array) -> bool:
+        return any(frame is b for b in self._buffers)
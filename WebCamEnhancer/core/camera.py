@@ -1,68 +1,182 @@
-import cv2, pyvirtualcam, threading, queue, copy, time
+import cv2, threading, queue, time
 import numpy as np
-from typing import Optional
-from pathlib import Path
+from typing import Optional, Union
 
 from ..config import Configuration
-from .base import ModuleController
+from .base import FrameViews
+from .registry import PLUGINS
+from .buffers import FrameQueue, FramePool
+from .sources import FrameSource, SourceError, make_source
+from .sinks import FrameSink, SinkError, make_sink
+from .profiling import Tracer, NULL_TRACER
+from .pipeline import MiddlewarePipeline
+from .scheduler import DriverScheduler
+from .color import compose
 from .utils import logger
 
 class CameraError(Exception):
     pass
 
-def start_input(input_device: str, 
+def start_input(input_device: Union[FrameSource, int, str],
                 width: Optional[int], height: Optional[int], fps: Optional[float]
-                ) -> tuple[cv2.VideoCapture, dict]:
+                ) -> tuple[FrameSource, dict]:
     """
-    Starts input_cam capture thread and processing thread.
+    Opens frame source for input device (camera, video file, image directory or "synthetic").
     """
-    cam = cv2.VideoCapture(input_device)
-    if not cam.isOpened():
-        raise CameraError(f"Unable to capture input device '{input_device}'")
-    if width is not None:
-        cam.set(cv2.CAP_PROP_FRAME_WIDTH, width)
-    if height is not None:
-        cam.set(cv2.CAP_PROP_FRAME_HEIGHT, height)
-    if fps is not None:
-        cam.set(cv2.CAP_PROP_FPS, fps)
-
-    width, height, fps = (
-        int(cam.get(cv2.CAP_PROP_FRAME_WIDTH)),
-        int(cam.get(cv2.CAP_PROP_FRAME_HEIGHT)),
-        cam.get(cv2.CAP_PROP_FPS)
-    )
-    logger.info("Acquired input camera '%s' with config %dx%dpx %dfps", input_device, width, height, fps)
-    return (cam, {
-        "width": width,
-        "height": height,
-        "fps": fps
-    })
-
-def start_output(output_device: str, width: int, height: int, fps: int,
-                pixel_format: pyvirtualcam.PixelFormat = pyvirtualcam.PixelFormat.BGR,
-                ) -> tuple[pyvirtualcam.camera.Camera, dict]:
-    if not Path(output_device).exists():
-        raise CameraError(f"Invalid output device: '{output_device}'")
+    source = make_source(input_device, width, height, fps)
     try:
-        cam = pyvirtualcam.Camera(width=int(width), height=int(height), fps=fps, fmt=pixel_format, device=output_device)
-    except RuntimeError as r:
-        raise CameraError(f"Failed to connect to output device: '{output_device}'. {r}")
-    logger.info("Acquired output stream '%s' with config %dx%dpx %dfps",output_device, cam.width, cam.height, cam.fps)
-    return (cam, {
-        "width": cam.width,
-        "height": cam.height,
-        "fps": cam.fps
-    })
+        props = source.open()
+    except SourceError as e:
+        raise CameraError(*e.args)
+    logger.info("Acquired input '%s' with config %dx%dpx %dfps", input_device, props["width"], props["height"], props["fps"])
+    return (source, props)
+
+def start_output(output_device: Union[FrameSink, str], width: int, height: int, fps: Optional[float]
+                ) -> tuple[FrameSink, dict]:
+    """
+    Opens frame sink for output device (loopback device, "null", file or comma separated list of them).
+    """
+    try:
+        sink = make_sink(output_device, width, height, fps)
+        props = sink.open()
+    except SinkError as e:
+        raise CameraError(*e.args)
+    logger.info("Acquired output '%s' with config %dx%dpx %dfps", output_device, props["width"], props["height"], props["fps"])
+    return (sink, props)
+
+class FusedFilter:
+    "Consecutive filters with color transforms applied as one pass."
+
+    IN_PLACE = True
+
+    def __init__(self, filters):
+        self.filters = tuple(filters)
+        self._sources = None
+        self._transform = None
+
+    def color_transform(self):
+        # filters can rebuild their transforms when config changes
+        sources = tuple(f.color_transform() for f in self.filters)
+        if self._sources is None or any(a is not b for a, b in zip(sources, self._sources)):
+            self._sources = sources
+            self._transform = compose(sources)
+        return self._transform
+
+    @property
+    def ready(self) -> bool:
+        return all(f.ready for f in self.filters)
+
+    def static_output(self) -> bool:
+        return False
+
+    def apply(self, frame, out=None):
+        return self.color_transform().apply(frame, out)
+
+
+class RegionFilter:
+    """
+    Filter applied only to region of frame and composited back. Region is:
+      - "foreground": bounding box of Selfie mask above `threshold`,
+      - "face": each box from Cascade,
+      - [x, y, w, h]: fixed rectangle.
+    Detected boxes are grown by `margin` pixels. Filter sees the region in `region` attribute.
+    """
+
+    IN_PLACE = True
+
+    # middleware detecting region
+    REQUIRES = {"foreground": "Selfie", "face": "Cascade"}
+
+    def __init__(self, flt, region, middleware, margin: int = 16, threshold: float = 0.1):
+        if region not in ("foreground", "face") and (isinstance(region, str) or len(region) != 4):
+            raise ValueError(f"Unknown region {region!r}. Use 'foreground', 'face' or [x, y, w, h].")
+        self.filter = flt
+        self.region = region
+        self.middleware = middleware
+        self.margin = margin
+        self.threshold = threshold
+
+    @property
+    def ready(self) -> bool:
+        return self.filter.ready
+
+    def static_output(self) -> bool:
+        return False
+
+    def boxes(self, shape: tuple) -> list:
+        "Boxes (x, y, w, h) clipped to frame of `shape`."
+        margin = self.margin
+        if self.region == "foreground":
+            mask = self.middleware["Selfie"].get()
+            found = [cv2.boundingRect((mask > self.threshold).view(np.uint8))]
+        elif self.region == "face":
+            found = self.middleware["Cascade"].get()
+        else:
+            found, margin = [self.region], 0
+        boxes = []
+        for x, y, w, h in found:
+            if w <= 0 or h <= 0:
+                continue
+            x1, y1 = max(0, int(x) - margin), max(0, int(y) - margin)
+            x2, y2 = min(shape[1], int(x + w) + margin), min(shape[0], int(y + h) + margin)
+            if x2 > x1 and y2 > y1:
+                boxes.append((x1, y1, x2 - x1, y2 - y1))
+        return boxes
+
+    def apply(self, frame, out=None):
+        if out is None:
+            out = frame
+        elif out is not frame:
+            np.copyto(out, frame)
+        flt = self.filter
+        try:
+            for x, y, w, h in self.boxes(frame.shape):
+                flt.region = (x, y, w, h)
+                region = out[y:y+h, x:x+w]
+                if flt.IN_PLACE:
+                    result = flt.apply(region, out=region)
+                else:
+                    result = flt.apply(region)
+                if result is not region:
+                    np.copyto(region, result)
+        finally:
+            flt.region = None
+        return out
+
+
+class LazyMiddleware(dict):
+    "Middleware by name. Missing one is loaded and prepared when asked for."
+
+    def __init__(self, load):
+        super().__init__()
+        self._load = load
+
+    def __missing__(self, name):
+        return self._load(name)
+
 
 class CamerasWorker:
 
     CONFIG_TEMPLATE = {
         "error_frames_max": 10,
-        "frame_delay_max": 0.1
+        "frame_delay_max": 0.1,
+        "input_queue_size": 2,
+        "input_queue_policy": "drop_oldest",
+        "preview_queue_size": 2,
+        "preview_queue_policy": "drop_oldest",
+        "trace_enabled": False,
+        "trace_path": "trace.json",
+        "fuse_filters": True,
+        "middleware_pipelined": False,
+        "active_drivers": [],
+        "filter_regions": {"Pixel": "foreground"},
+        "region_margin": 16,
+        "static_capture_fps": 2.
     }
 
     def __init__(self, in_cam, out_cam, width=None, height=None, fps=None, preview=True, stream=True):
-        self.config = Configuration.get_custom_config(self.__class__)
+        # subclasses share the config
+        self.config = Configuration.get_custom_config(CamerasWorker)
         self.in_cam_name = in_cam
         self.out_cam_name = out_cam
         self._setup_data = {"width": width, "height": height, "fps": fps}
@@ -75,14 +189,34 @@ class CamerasWorker:
         self.streaming = stream
 
         self._active_filters = tuple()
+        self._plan = None
 
-        self._middleware = {}
+        self._middleware = LazyMiddleware(self._load_middleware)
         self._filters = {}
+        self._drivers = {}
+        self._load_lock = threading.RLock()
 
         self._stop = threading.Event()
         self._error = threading.Event()
-        self._image_queue = queue.Queue()
-        
+        # cleared while output is static and capture is throttled
+        self._live = threading.Event()
+        self._live.set()
+        self._static = None
+        self._input_queue = None
+        self._image_queue = FrameQueue(self.config["preview_queue_size"], self.config["preview_queue_policy"])
+        self._stale_frames = 0
+        self._frame_pool = None
+        # frame returned by get_frame(), its buffer is reused after next call
+        self._previewed = None
+        self._frame_index = 0
+        # perf_counter() of capture of frame being processed
+        self.frame_time = None
+        self._pipeline = None
+        self._scheduler = None
+        # derived views of captured frame shared by middleware and filters
+        self.views = FrameViews()
+        self.tracer = NULL_TRACER
+
         self._errors = []
         self._threads = []
 
@@ -92,9 +226,156 @@ class CamerasWorker:
 
     @filters.setter
     def filters(self, filters):
-        self._active_filters = tuple(filters)
+        filters = tuple(filters)
+        if self.resolution is not None:
+            # prepare newly activated filters before processing thread sees them
+            for name in filters:
+                try:
+                    self._load_filter(name)
+                except CameraError as e:
+                    logger.error("%s", e)
+            filters = tuple(name for name in filters if name in self._filters)
+        self._active_filters = filters
         logger.info("Filters changed to: %s", self._active_filters)
 
+    def _create_middleware(self, name: str):
+        "Imports and prepares new instance of middleware `name`."
+        configs = Configuration.get("Middleware", {})
+        try:
+            mdl = PLUGINS.load("Middleware", name)(configs.get(name, {}))
+            mdl.prepare(self.resolution)
+        except Exception as e:
+            raise CameraError(f"Failed to prepare Middleware '{name}': {e}")
+        return mdl
+
+    def _load_middleware(self, name: str):
+        "Imports, prepares and returns middleware `name`."
+        with self._load_lock:
+            if name in self._middleware:
+                return dict.__getitem__(self._middleware, name)
+            mdl = self._create_middleware(name)
+            mdl.tracer = self.tracer
+            mdl.pipeline = self._pipeline
+            # loaded during frame processing, frame of other middleware was already set
+            if self.views.frame is not None:
+                mdl.set_frame(self.views.frame, self.views.index, self.views)
+            self._middleware[name] = mdl
+            logger.debug("Middleware: %s", list(self._middleware))
+            return mdl
+
+    def _load_filter(self, name: str):
+        "Imports and prepares filter `name` with middleware it requires."
+        with self._load_lock:
+            if name in self._filters:
+                return self._filters[name]
+            configs = Configuration.get("Filter", {})
+            try:
+                descriptor = PLUGINS.get("Filter", name)
+                required = descriptor.requires
+                region = self.config["filter_regions"].get(name)
+                if isinstance(region, str) and region in RegionFilter.REQUIRES:
+                    required += (RegionFilter.REQUIRES[region],)
+                for m in required:
+                    self._middleware[m]
+                flt = descriptor.load()(configs.get(name, {}), self._middleware, self)
+                flt.prepare(self.resolution)
+                flt.start_warm_up(self.resolution)
+            except CameraError:
+                raise
+            except Exception as e:
+                raise CameraError(f"Failed to prepare Filter '{name}': {e}")
+            self._filters[name] = flt
+            logger.debug("Filters: %s", list(self._filters))
+            return flt
+
+    def _make_plan(self, filters) -> list:
+        """
+        Pairs (name, filter) to apply. Runs of consecutive pointwise filters are fused,
+        filters with region in `filter_regions` are wrapped by RegionFilter.
+        """
+        plan = []
+        run = []
+        def flush():
+            if len(run) > 1:
+                plan.append(("+".join(name for name, _ in run), FusedFilter(f for _, f in run)))
+            else:
+                plan.extend(run)
+            run.clear()
+
+        regions = self.config["filter_regions"]
+        for name in filters:
+            flt = self._filters[name]
+            if name in regions:
+                flush()
+                plan.append((name, RegionFilter(flt, regions[name], self._middleware, self.config["region_margin"])))
+            elif self.config["fuse_filters"] and flt.color_transform() is not None:
+                run.append((name, flt))
+            else:
+                flush()
+                plan.append((name, flt))
+        flush()
+        logger.info("Filter plan: %s", [name for name, _ in plan])
+        return plan
+
+    def _apply_plan(self, frame: np.array, scratch_pool: FramePool, owned: bool = True) -> np.array:
+        """
+        Applies ready filters of current plan to `frame`, overwritten only when `owned` by worker.
+        Scratch buffers are acquired from `scratch_pool`, all but the returned one are released.
+        Returned frame is the input `frame` or a buffer owned by worker, never array of a filter
+        (cached background of Away changes with its next frame).
+        """
+        source = frame
+        scratch = []
+
+        def acquire(like):
+            if like.shape != scratch_pool.shape:
+                return np.empty_like(like)
+            buffer = scratch_pool.acquire()
+            scratch.append(buffer)
+            return buffer
+
+        for name, flt in self._plan[1]:
+            if not flt.ready:
+                continue
+            with self.tracer.span(name, "filter"):
+                if flt.IN_PLACE:
+                    out = frame if owned else acquire(frame)
+                    frame = flt.apply(frame, out=out)
+                    owned = frame is out
+                else:
+                    if not owned:
+                        # filter can draw into its input, which isn't ours
+                        buffer = acquire(frame)
+                        np.copyto(buffer, frame)
+                        frame, owned = buffer, True
+                    result = flt.apply(frame)
+                    owned = result is frame
+                    frame = result
+                # frame may be changed, views are of captured frame only
+                self.views.alias = None
+        if not owned and frame is not source:
+            buffer = acquire(frame)
+            np.copyto(buffer, frame)
+            frame = buffer
+        for buffer in scratch:
+            if buffer is not frame:
+                scratch_pool.release(buffer)
+        return frame
+
+    @staticmethod
+    def _static_step(plan: list):
+        "Last filter of plan when its output doesn't depend on camera frames."
+        if plan and plan[-1][1].ready and plan[-1][1].static_output():
+            return plan[-1][1]
+        return None
+
+    @staticmethod
+    def _render_static(flt, frame: np.array) -> np.array:
+        "Output of static filter kept to be sent again."
+        if flt.IN_PLACE:
+            return flt.apply(frame, out=frame).copy()
+        return flt.apply(frame).copy()
+
     @property
     def preview(self):
         return self._preview
@@ -121,46 +402,55 @@ class CamerasWorker:
     def output_cam_properties(self):
         return self._output_props
 
+    @property
+    def frame_index(self) -> int:
+        "Index of frame being processed."
+        return self._frame_index
+
+    @property
+    def queue_stats(self) -> dict:
+        "Dropped frames and high-water marks of frame queues."
+        return {
+            "input": self._input_queue.stats if self._input_queue is not None else None,
+            "preview": self._image_queue.stats,
+            "stale": self._stale_frames,
+            "middleware": self._pipeline.stats if self._pipeline is not None else None
+        }
+
     def prepare(self):
         self._input_cam, self._input_props = start_input(self.in_cam_name, **self._setup_data)
         self._output_cam, self._output_props = start_output(self.out_cam_name, **self._input_props)
         self.resolution = (self._input_props["width"], self._input_props["height"])
+        self._prepare_modules()
 
-        self._middleware = {}
-        configs = Configuration.get("Middleware", {})
-        for m in ModuleController.MODULES["Middleware"]:
-            try:
-                mdl = m(configs.get(m.__name__, {}))
-                mdl.prepare(self.resolution)
-                self._middleware[m.__name__] = mdl
-            except Exception as e:
-                raise CameraError(f"Failed to prepare Middleware '{m.__name__}': {e}")
-        logger.debug("Middleware: %s", self._middleware.keys())
+    def _prepare_modules(self):
+        "Prepares active filters and drivers for `resolution`."
+        self.tracer = Tracer() if self.config["trace_enabled"] else NULL_TRACER
 
+        self._middleware = LazyMiddleware(self._load_middleware)
         self._filters = {}
-        configs = Configuration.get("Filter", {})
-        for f in ModuleController.MODULES["Filter"]:
-            try:
-                flt = f(configs.get(f.__name__, {}), self._middleware, self)
-                flt.prepare(self.resolution)
-                self._filters[f.__name__] = flt
-            except Exception as e:
-                raise CameraError(f"Failed to prepare Filter '{f.__name__}': {e}")
-        logger.debug("Filters: %s", self._filters.keys())
+        self.views = FrameViews()
+        for name in self._active_filters:
+            self._load_filter(name)
 
         self._drivers = {}
         configs = Configuration.get("Driver", {})
-        for d in ModuleController.MODULES["Driver"]:
+        for name in self.config["active_drivers"]:
             try:
-                drv = d(configs.get(f.__name__, {}), self._middleware, self)
+                descriptor = PLUGINS.get("Driver", name)
+                for m in descriptor.requires:
+                    self._middleware[m]
+                drv = descriptor.load()(configs.get(name, {}), self._middleware, self)
                 drv.prepare()
-                self._drivers[d.__name__] = drv
+                for m in drv.requires:
+                    self._middleware[m]
+                self._drivers[name] = drv
+            except CameraError:
+                raise
             except Exception as e:
-                raise CameraError(f"Failed to prepare Driver '{d.__name__}': {e}")
+                raise CameraError(f"Failed to prepare Driver '{name}': {e}")
         logger.debug("Drivers: %s", self._drivers.keys())
 
-
-
     def stop(self):
         logger.info("Stopping aquisition.")
         self._stop.set()
@@ -168,89 +458,233 @@ class CamerasWorker:
             thrd = self._threads.pop()
             thrd.join()
         self._input_cam.release()
+        self._release()
+
+    def _release(self):
+        "Stops drivers and middleware pipeline, releases filters and output."
+        if self._scheduler is not None:
+            self._scheduler.stop()
+            self._scheduler = None
+        if self._pipeline is not None:
+            self._pipeline.stop()
+        for name, flt in self._filters.items():
+            try:
+                flt.release()
+            except Exception as e:
+                logger.warning("Failed to release Filter '%s': %s", name, e)
         self._output_cam.close()
-        logger.info("Stoped.")
+        if self.tracer.enabled:
+            self.tracer.export(self.config["trace_path"])
+            logger.info("Trace saved to '%s'.", self.config["trace_path"])
+        logger.info("Stoped. Queues: %s", self.queue_stats)
 
     def start(self):
         max_error_frames = self.config["error_frames_max"]
+        frame_delay_max = self.config["frame_delay_max"]
         self.prepare()
-        input_queue = queue.Queue()
-        self._image_queue = queue.Queue()
+
+        # Recycled frame buffers. Captured and scratch frames are released when nobody uses them:
+        # dropped from queue, replaced by filter output, sent without preview or previewed.
+        # Raw frames live only during processing.
+        shape = (self.resolution[1], self.resolution[0], 3)
+        frame_pool = FramePool(shape, self.config["input_queue_size"] + self.config["preview_queue_size"] + 3)
+        raw_pool = FramePool(shape, 2)
+        self._frame_pool = frame_pool
+        self._previewed = None
+
+        input_queue = FrameQueue(self.config["input_queue_size"], self.config["input_queue_policy"],
+                                 on_drop=lambda item: frame_pool.release(item[0]))
+        self._input_queue = input_queue
+        self._image_queue = FrameQueue(self.config["preview_queue_size"], self.config["preview_queue_policy"],
+                                       on_drop=frame_pool.release)
+        self._stale_frames = 0
+        tracer = self.tracer
+
+        # middleware of next frame computed meanwhile filters use last completed result
+        pipeline = None
+        if self.config["middleware_pipelined"]:
+            pipeline = MiddlewarePipeline(self._middleware, shape)
+            pipeline.start()
+        self._pipeline = pipeline
+
+        # drivers run on own thread with snapshots of processed frames
+        scheduler = None
+        if self._drivers:
+            scheduler = DriverScheduler(self, self._drivers, self.tracer)
+            scheduler.start()
+        self._scheduler = scheduler
+        self._static = None
+        self._live.set()
 
         def input_worker():
             error_counter = 0
+            static_interval = 1. / max(self.config["static_capture_fps"], 0.1)
             while not self._stop.is_set():
-                ret, frame = self._input_cam.read()
+                if not self._live.is_set():
+                    # output doesn't depend on camera, frames are still read slowly for drivers
+                    self._live.wait(static_interval)
+                buffer = frame_pool.acquire()
+                with tracer.span("read", "capture"):
+                    ret, frame = self._input_cam.read(buffer)
+                if frame is not buffer:
+                    frame_pool.release(buffer)
                 if not ret:
                     logger.warning("Unsuccessful aquisition of frame. %d until stop.", max_error_frames - error_counter)
                     if error_counter > max_error_frames:
+                        e = CameraError(f"Unable to read from input device '{self.in_cam_name}'")
                         self._errors.append((e, e.args))
                         self._error.set()
                         break
                     error_counter += 1
-                input_queue.put((frame, time.perf_counter()))
+                    continue
+                # with "block" policy wait for processing but still check for stop
+                input_queue.put((frame, time.perf_counter()), timeout=frame_delay_max)
 
-        input_thread = threading.Thread(target=input_worker,daemon=True)
+        input_thread = threading.Thread(target=input_worker, name="capture", daemon=True)
 
         def processing_worker():
             max_error_frames = self.config["error_frames_max"]
             frame_delay_max = self.config["frame_delay_max"]
 
             error_counter = 0
-            raw_frame = None
+            send_interval = 1. / (self._output_props["fps"] or 30.)
+            next_send = 0.
+
+            def take(frame):
+                "Makes frame current for middleware."
+                self._frame_index += 1
+                tracer.frame = self._frame_index
+                with tracer.span("set_frame"):
+                    raw_frame = raw_pool.copy(frame)
+                    self.views.set_frame(raw_frame, self._frame_index, alias=frame)
+                    # middleware can be added by activation of filter meanwhile
+                    for m in list(self._middleware.values()):
+                        # set actual frame for processiong if needed by filters
+                        m.set_frame(raw_frame, self._frame_index, self.views)
+                return raw_frame
+
+            def send(frame):
+                "Outputs frame, its buffer is released when preview queue or GUI are done with it."
+                if self._streaming:
+                    with tracer.span("send", "output"):
+                        self._output_cam.send(frame)
+                if self._preview:
+                    with tracer.span("preview", "output"):
+                        # with "block" policy and nobody reading, frame is dropped and released
+                        self._image_queue.put(frame, timeout=frame_delay_max)
+                else:
+                    frame_pool.release(frame)
+
+            def collect_snapshot(when):
+                if scheduler is not None:
+                    with tracer.span("snapshot", "driver"):
+                        scheduler.collect(self._middleware, when)
+
             while not self._stop.is_set():
-                frame, when = input_queue.get()
-                if (time.perf_counter() - when) > frame_delay_max:
-                    continue
-                if frame is not None:
+                try:
+                    filters = self._active_filters
+                    if self._plan is None or self._plan[0] is not filters:
+                        self._plan = (filters, self._make_plan(filters))
+                    static = self._static_step(self._plan[1])
+                    if static is not None:
+                        # same output until filters change: send it again, capture only for drivers
+                        if self._static is None or self._static[0] is not static:
+                            try:
+                                frame, when = input_queue.get(timeout=frame_delay_max)
+                            except queue.Empty:
+                                continue
+                            with tracer.span(self._plan[1][-1][0], "filter"):
+                                self._static = (static, self._render_static(static, frame))
+                            frame_pool.release(frame)
+                            self._live.clear()
+                            logger.info("Output of '%s' is static. Capture throttled.", self._plan[1][-1][0])
+                        now = time.perf_counter()
+                        if now >= next_send:
+                            send(self._static[1])
+                            next_send = max(next_send + send_interval, now)
+                        try:
+                            frame, when = input_queue.get(timeout=max(0., next_send - time.perf_counter()))
+                        except queue.Empty:
+                            continue
+                        try:
+                            raw_frame = take(frame)
+                            # sampled frames keep pipelined results of drivers up to date
+                            if pipeline is not None:
+                                pipeline.submit(raw_frame, self._frame_index)
+                            collect_snapshot(when)
+                        finally:
+                            frame_pool.release(frame)
+                        continue
+                    if self._static is not None:
+                        self._static = None
+                        self._live.set()
+                        logger.info("Output is live again.")
+
                     try:
-                        # middleware
-                        raw_frame = frame.copy()
-                        for m in self._middleware.values():
-                            # set actual frame for processiong if needed by filters
-                            m.set_frame(raw_frame)
-
-                        for name in self._active_filters:
-                            # logger.debug("Using %s", name)
-                            frame = self._filters[name].apply(frame)
-
-                        # handle outputs
-                        if self._streaming:
-                            self._output_cam.send(frame)
-                        if self._preview:
-                            self._image_queue.put(frame)
-
-                        # Handle drivers
-                        for d in self._drivers.values():
-                            d.resolve()
-                    except Exception as e:
-                        logger.warning("Badly processed of frame. %d until stop. %s: %s", 
-                        max_error_frames - error_counter,
-                        e, ", ".join(e.args)
-                        )
-                        # fail if to mutch error frames
-                        if error_counter > max_error_frames:
-                            self._errors.append((e, e.args))
-                            self._error.set()
-                            break
-                        error_counter += 1
-
-        process_thread = threading.Thread(target=processing_worker,daemon=True)
+                        frame, when = input_queue.get(timeout=frame_delay_max)
+                    except queue.Empty:
+                        continue
+                    if (time.perf_counter() - when) > frame_delay_max:
+                        self._stale_frames += 1
+                        frame_pool.release(frame)
+                        continue
+                    if frame is None:
+                        continue
+                    output = None
+                    try:
+                        with tracer.span("frame", "frame", latency=time.perf_counter() - when):
+                            # middleware
+                            self.frame_time = when
+                            raw_frame = take(frame)
+                            if pipeline is not None:
+                                pipeline.submit(raw_frame, self._frame_index)
+
+                            output = self._apply_plan(frame, frame_pool)
+
+                            # handle outputs
+                            send(output)
+
+                            # snapshot for drivers when some is due
+                            collect_snapshot(when)
+                    finally:
+                        # captured frame is not needed when filters made new one
+                        if output is not frame:
+                            frame_pool.release(frame)
+                except Exception as e:
+                    logger.warning("Badly processed of frame. %d until stop. %s: %s", 
+                    max_error_frames - error_counter,
+                    e, ", ".join(str(a) for a in e.args)
+                    )
+                    # fail if to mutch error frames
+                    if error_counter > max_error_frames:
+                        self._errors.append((e, e.args))
+                        self._error.set()
+                        break
+                    error_counter += 1
+
+        process_thread = threading.Thread(target=processing_worker, name="processing", daemon=True)
 
+        self._threads = [input_thread, process_thread]
         input_thread.start()
         process_thread.start()
         logger.info("Started aquisition.")
 
     def get_frame(self, block=True, timeout: int = 0.1)-> Optional[np.array]:
+        "Next preview frame. It's valid until next call, then its buffer gets reused."
         if not self.preview:
             raise CameraError("Preview disabled.")
+        if self._previewed is not None:
+            self._frame_pool.release(self._previewed)
+            self._previewed = None
         try:
             frame = self._image_queue.get(block, timeout)
+            if self._frame_pool is not None:
+                self._previewed = frame
 
             # Reraise last error in threads
             if frame is None and self._error.is_set():
                 try:
-                    err = self.errors.pop()
+                    err = self._errors.pop()
                     raise CameraError(f"Error in CameraWorker threads: {err[0]}: {', '.join(err[1])}")
                 except IndexError:
                     raise CameraError("Unable to fetch frame.")
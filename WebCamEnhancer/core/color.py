@@ -0,0 +1,146 @@
+"""
+Per-pixel color transforms. Each has apply(frame, out=None) working on uint8 BGR frames
+and consecutive transforms can be fused into one with compose().
+"""
+import cv2
+import numpy as np
+from typing import Callable, Optional, Sequence
+
+from .utils import lazy_jit
+
+
+class Affine:
+    "Color matrix with offset: out = matrix @ bgr + offset. Applied by single cv2.transform pass."
+
+    def __init__(self, matrix: np.array, offset: Optional[np.array] = None):
+        self.matrix = np.asarray(matrix, np.float32).reshape(3, 3)
+        self.offset = np.zeros(3, np.float32) if offset is None else np.asarray(offset, np.float32)
+        self._kernel = np.hstack((self.matrix, self.offset[:, None]))
+
+    @property
+    def saturates(self) -> bool:
+        "True if some color in 0..255 cube maps out of that range."
+        low = np.minimum(self.matrix, 0).sum(axis=1) * 255 + self.offset
+        high = np.maximum(self.matrix, 0).sum(axis=1) * 255 + self.offset
+        return bool((low < -0.5).any() or (high > 255.5).any())
+
+    def apply(self, frame: np.array, out: Optional[np.array] = None) -> np.array:
+        return cv2.transform(frame, self._kernel, dst=out)
+
+
+class LUT1D:
+    "Independent lookup table for each BGR channel. Applied by single cv2.LUT pass."
+
+    def __init__(self, table: np.array):
+        # (256, 3) or (256,) for same table in all channels
+        table = np.asarray(table, np.uint8)
+        if table.ndim == 1:
+            table = np.repeat(table[:, None], 3, axis=1)
+        self.table = np.ascontiguousarray(table.reshape(1, 256, 3))
+
+    def apply(self, frame: np.array, out: Optional[np.array] = None) -> np.array:
+        return cv2.LUT(frame, self.table, dst=out)
+
+
+@lazy_jit(nopython=True, nogil=True, fastmath=True)
+def _apply_lut3d(frame, flat, offset, frac, db, dg, out):
+    # Tetrahedral interpolation: 4 of 8 surrounding lattice points chosen by order of fractions.
+    height, width = frame.shape[:2]
+    o3 = db + dg + 3
+    for y in range(height):
+        for x in range(width):
+            b = frame[y, x, 0]
+            g = frame[y, x, 1]
+            r = frame[y, x, 2]
+            base = offset[0, b] + offset[1, g] + offset[2, r]
+            fb = frac[b]
+            fg = frac[g]
+            fr = frac[r]
+            if fb >= fg:
+                if fg >= fr:
+                    w0, w1, w2, w3, o1, o2 = 1 - fb, fb - fg, fg - fr, fr, db, db + dg
+                elif fb >= fr:
+                    w0, w1, w2, w3, o1, o2 = 1 - fb, fb - fr, fr - fg, fg, db, db + 3
+                else:
+                    w0, w1, w2, w3, o1, o2 = 1 - fr, fr - fb, fb - fg, fg, 3, db + 3
+            else:
+                if fr >= fg:
+                    w0, w1, w2, w3, o1, o2 = 1 - fr, fr - fg, fg - fb, fb, 3, dg + 3
+                elif fr >= fb:
+                    w0, w1, w2, w3, o1, o2 = 1 - fg, fg - fr, fr - fb, fb, dg, dg + 3
+                else:
+                    w0, w1, w2, w3, o1, o2 = 1 - fg, fg - fb, fb - fr, fr, dg, db + dg
+            for c in range(3):
+                i = base + c
+                value = w0 * flat[i] + w1 * flat[i + o1] + w2 * flat[i + o2] + w3 * flat[i + o3]
+                out[y, x, c] = np.uint8(value + np.float32(0.5))
+    return out
+
+
+class LUT3D:
+    """
+    Lookup of BGR color on lattice of BGR colors with tetrahedral interpolation.
+    Any per-pixel color operation can be baked into it. Applied in single pass over frame.
+    """
+
+    def __init__(self, table: np.array, step: int):
+        # table[b, g, r] -> BGR, lattice point i is color value i*step
+        self.table = np.ascontiguousarray(table, np.float32)
+        self.step = step
+        n = self.table.shape[0]
+        # lattice cell offsets in flat table and position inside cell for each channel value
+        position = np.arange(256) / step
+        index = np.minimum(position.astype(np.int64), n - 2)
+        self._frac = (position - index).astype(np.float32)
+        self._offset = np.stack((index * n * n * 3, index * n * 3, index * 3))
+        self._flat = self.table.ravel()
+        self._strides = (n * n * 3, n * 3)
+
+    @staticmethod
+    def lattice(step: int) -> np.array:
+        "Image with all lattice colors. Shape (n*n, n, 3) where n = 255/step + 1."
+        values = np.arange(0, 256, step, dtype=np.uint8)
+        if values[-1] != 255:
+            raise ValueError("Lattice step must divide 255.")
+        n = len(values)
+        b, g, r = np.meshgrid(values, values, values, indexing="ij")
+        return np.stack((b, g, r), axis=-1).reshape(n * n, n, 3)
+
+    @classmethod
+    def bake(cls, function: Callable[[np.array], np.array], step: int = 5) -> "LUT3D":
+        "Evaluates uint8 BGR frame function on lattice."
+        lattice = cls.lattice(step)
+        n = lattice.shape[1]
+        return cls(function(lattice).reshape(n, n, n, 3), step)
+
+    def apply(self, frame: np.array, out: Optional[np.array] = None) -> np.array:
+        if out is None:
+            out = np.empty_like(frame)
+        return _apply_lut3d(frame, self._flat, self._offset, self._frac, *self._strides, out)
+
+
+def compose(transforms: Sequence, step: int = 5):
+    """
+    Fuses transforms applied in order into one.
+    Matrices without saturation and per-channel tables are combined exactly,
+    other combinations are baked into LUT3D.
+    """
+    transforms = list(transforms)
+    if len(transforms) == 1:
+        return transforms[0]
+    if all(isinstance(t, LUT1D) for t in transforms):
+        table = transforms[0].table[0]
+        for t in transforms[1:]:
+            table = np.take_along_axis(t.table[0], table.astype(np.intp), axis=0)
+        return LUT1D(table)
+    if all(isinstance(t, Affine) for t in transforms) and not any(t.saturates for t in transforms[:-1]):
+        matrix, offset = transforms[0].matrix, transforms[0].offset
+        for t in transforms[1:]:
+            matrix, offset = t.matrix @ matrix, t.matrix @ offset + t.offset
+        return Affine(matrix, offset)
+
+    def chain(frame):
+        for t in transforms:
+            frame = t.apply(frame)
+        return frame
+    return LUT3D.bake(chain, step)
@@ -0,0 +1,118 @@
+import threading
+import numpy as np
+
+from .base import FrameViews
+from .utils import logger
+
+
+class MiddlewarePipeline:
+    """
+    Computes middleware on its own thread for the newest submitted frame.
+    Middleware.get() then returns the latest completed result instead of computing it,
+    so filters of frame N use result of frame N-1 (or older when middleware is slower).
+    Index of frame the result belongs to is in Middleware.result_index.
+
+    Only middleware requested by get() during last REQUEST_WINDOW frames is computed.
+    First request is computed synchronously on the current frame.
+    """
+
+    REQUEST_WINDOW = 30
+
+    def __init__(self, middleware: dict, shape: tuple):
+        self.middleware = middleware
+        self.shape = tuple(shape)
+        self.computed = 0
+        self.dropped = 0
+        # one buffer being computed, one pending and one free for next copy
+        self._buffers = [np.empty(self.shape, np.uint8) for _ in range(3)]
+        self._processing = None
+        self._pending = None
+        self._cond = threading.Condition()
+        self._results = {}
+        self._requested = {}
+        self._index = 0
+        self._stop = threading.Event()
+        self._thread = None
+        self._views = FrameViews()
+
+    @property
+    def stats(self) -> dict:
+        "Frames of lag of latest results and count of computed frames."
+        return {
+            "lag": {name: self._index - index for name, (_, index) in self._results.items()},
+            "computed": self.computed,
+            "dropped": self.dropped
+        }
+
+    def start(self):
+        for mdl in self.middleware.values():
+            mdl.pipeline = self
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._worker, name="middleware", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self._views = FrameViews()
+        for mdl in list(self.middleware.values()):
+            mdl.pipeline = None
+        self._pending = None
+        self._results.clear()
+        self._requested.clear()
+
+    def submit(self, frame: np.array, index: int):
+        "Hands copy of frame over for computation. Older pending frame is dropped."
+        self._index = index
+        if not self._requested:
+            return
+        with self._cond:
+            if frame.shape != self.shape:
+                buffer = frame.copy()
+            else:
+                pending = self._pending[0] if self._pending is not None else None
+                buffer = next(b for b in self._buffers if b is not self._processing and b is not pending)
+                np.copyto(buffer, frame)
+            if self._pending is not None:
+                self.dropped += 1
+            self._pending = (buffer, index)
+            self._cond.notify()
+
+    def latest(self, mdl) -> tuple:
+        "Latest completed (result, frame index) of middleware."
+        name = mdl.__class__.__name__
+        self._requested[name] = self._index
+        item = self._results.get(name)
+        if item is None:
+            item = (mdl.compute(mdl._frame, mdl._views), mdl._index)
+            self._publish(name, item)
+        return item
+
+    def _publish(self, name: str, item: tuple):
+        # synchronous first result and worker thread can race, newer one wins
+        with self._cond:
+            previous = self._results.get(name)
+            if previous is None or previous[1] is None or (item[1] is not None and item[1] >= previous[1]):
+                self._results[name] = item
+
+    def _worker(self):
+        while not self._stop.is_set():
+            with self._cond:
+                if not self._cond.wait_for(lambda: self._pending is not None, 0.1):
+                    continue
+                (frame, index), self._pending = self._pending, None
+                self._processing = frame
+            self._views.set_frame(frame, index)
+            for name, mdl in list(self.middleware.items()):
+                if self._requested.get(name, -self.REQUEST_WINDOW - 1) < index - self.REQUEST_WINDOW:
+                    continue
+                try:
+                    self._publish(name, (mdl.compute(frame, self._views), index))
+                except Exception as e:
+                    logger.warning("Middleware '%s' failed on frame %d: %s", name, index, e)
+            with self._cond:
+                self.computed += 1
+                self._processing = None
+                self._cond.notify_all()
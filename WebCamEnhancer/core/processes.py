@@ -0,0 +1,623 @@
+"""
+Optional multi-process pipeline, CamerasWorker split into processes so that capture,
+middleware inference and compositing don't share one GIL:
+
+    capture ──> inference ──> compositing (filters, drivers, output) ──> preview
+
+Frames live in slots of SharedFrames, one shared memory block mapped by all processes.
+Processes hand over slot numbers only, numpy arrays are views into the block, so frames
+are not copied between processes. Masks of middleware in `planes` (e.g. Selfie) are written
+by inference into float32 planes of the slot and copied out once by compositing (results
+outlive the frame, filters keep them), other results (face boxes) are pickled.
+Slot returns to the `free` queue when compositing is done with it, so capture waits when
+all slots are in use and older frames are dropped when next stage is behind.
+
+Enabled by "enabled" in ProcessWorker config, it has the interface of CamerasWorker.
+"""
+import multiprocessing as mp, queue, time
+from multiprocessing import shared_memory
+import numpy as np
+from typing import Optional
+
+from ..config import Configuration
+from .base import FrameViews
+from .buffers import FramePool
+from .camera import CamerasWorker, CameraError, RegionFilter, start_input, start_output
+from .profiling import NULL_TRACER
+from .registry import PLUGINS
+from .scheduler import DriverScheduler
+from .utils import logger
+
+
+class SharedFrames:
+    """
+    Ring of `count` frame slots of `shape` (uint8) in one shared memory block, each slot
+    with float32 plane of frame size for every name in `planes`.
+    Instance pickled to other process attaches the same block by `name`.
+    """
+
+    def __init__(self, shape: tuple, count: int, planes: tuple = (), name: Optional[str] = None):
+        self.shape = tuple(shape)
+        self.count = count
+        self.planes = tuple(planes)
+        frame_bytes = int(np.prod(self.shape))
+        plane_bytes = self.shape[0] * self.shape[1] * 4
+        size = count * (frame_bytes + len(self.planes) * plane_bytes)
+        self.owner = name is None
+        self._shm = shared_memory.SharedMemory(name, create=self.owner, size=size if self.owner else 0)
+        buf = self._shm.buf
+        self.frames = [np.ndarray(self.shape, np.uint8, buf, i * frame_bytes) for i in range(count)]
+        offset = count * frame_bytes
+        self.masks = []
+        for _ in range(count):
+            slot = {}
+            for plane in self.planes:
+                slot[plane] = np.ndarray(self.shape[:2], np.float32, buf, offset)
+                offset += plane_bytes
+            self.masks.append(slot)
+
+    @property
+    def name(self) -> str:
+        return self._shm.name
+
+    def __reduce__(self):
+        return (self.__class__, (self.shape, self.count, self.planes, self.name))
+
+    def close(self):
+        self.frames, self.masks = [], []
+        try:
+            self._shm.close()
+        except BufferError:
+            # views still referenced somewhere, mapping goes away with the process
+            pass
+
+    def unlink(self):
+        "Frees the block, called by owner when all processes are done."
+        self._shm.unlink()
+
+
+class Channels:
+    "Queues and events connecting processes of ProcessWorker."
+
+    def __init__(self, context):
+        self.stop = context.Event()
+        # processes -> ProcessWorker: (kind, data)
+        self.status = context.Queue()
+        # SharedFrames for capture, allocated when input resolution is known
+        self.setup = context.Queue()
+        # slot numbers
+        self.free = context.Queue()
+        # (slot, index, capture time)
+        self.captured = context.Queue()
+        # (slot, index, capture time, results, names of results in planes)
+        self.inferred = context.Queue()
+        # names of middleware to compute
+        self.require = context.Queue()
+        # (attribute, value) for compositing
+        self.control = context.Queue()
+        # slot numbers of preview frames
+        self.preview_free = context.Queue()
+        # (slot, index)
+        self.preview_ready = context.Queue()
+
+
+def newest(items: mp.Queue, free: mp.Queue, timeout: float) -> tuple:
+    "Newest item of queue and count of skipped ones. Slots of skipped items are freed."
+    try:
+        item = items.get(timeout=timeout)
+    except queue.Empty:
+        return None, 0
+    skipped = 0
+    while True:
+        try:
+            later = items.get_nowait()
+        except queue.Empty:
+            return item, skipped
+        free.put(item[0])
+        item = later
+        skipped += 1
+
+
+def _capture_main(source, setup: dict, channels: Channels, config: dict):
+    Configuration.data = config
+    max_error_frames = Configuration.get_custom_config(CamerasWorker)["error_frames_max"]
+    try:
+        cam, props = start_input(source, **setup)
+    except CameraError as e:
+        channels.status.put(("error", str(e)))
+        return
+    channels.status.put(("input", props))
+    frames = None
+    while frames is None and not channels.stop.is_set():
+        try:
+            frames = channels.setup.get(timeout=0.1)
+        except queue.Empty:
+            pass
+
+    index, error_counter = 0, 0
+    try:
+        while not channels.stop.is_set():
+            try:
+                slot = channels.free.get(timeout=0.1)
+            except queue.Empty:
+                continue
+            view = frames.frames[slot]
+            ret, frame = cam.read(view)
+            if ret and frame is not view:
+                np.copyto(view, frame)
+            if not ret:
+                channels.free.put(slot)
+                logger.warning("Unsuccessful aquisition of frame. %d until stop.", max_error_frames - error_counter)
+                if error_counter > max_error_frames:
+                    channels.status.put(("error", f"Unable to read from input device '{source}'"))
+                    break
+                error_counter += 1
+                continue
+            index += 1
+            channels.captured.put((slot, index, time.perf_counter()))
+    finally:
+        cam.release()
+        if frames is not None:
+            frames.close()
+
+
+def _inference_main(frames: SharedFrames, channels: Channels, config: dict):
+    Configuration.data = config
+    configs = Configuration.get("Middleware", {})
+    resolution = (frames.shape[1], frames.shape[0])
+    middleware = {}
+    required = ()
+    views = FrameViews()
+    try:
+        while not channels.stop.is_set():
+            try:
+                while True:
+                    required = channels.require.get_nowait()
+            except queue.Empty:
+                pass
+            for name in required:
+                if name not in middleware:
+                    try:
+                        mdl = PLUGINS.load("Middleware", name)(configs.get(name, {}))
+                        mdl.prepare(resolution)
+                    except Exception as e:
+                        # compositing computes it by itself
+                        logger.warning("Failed to prepare Middleware '%s': %s", name, e)
+                        mdl = None
+                    middleware[name] = mdl
+
+            item, _ = newest(channels.captured, channels.free, 0.1)
+            if item is None:
+                continue
+            slot, index, when = item
+            frame = frames.frames[slot]
+            views.set_frame(frame, index)
+            results, planes = {}, []
+            for name in required:
+                mdl = middleware.get(name)
+                if mdl is None:
+                    continue
+                try:
+                    result = mdl.compute(frame, views)
+                except Exception as e:
+                    logger.warning("Middleware '%s' failed on frame %d: %s", name, index, e)
+                    continue
+                plane = frames.masks[slot].get(name)
+                if plane is not None and isinstance(result, np.ndarray) and result.shape == plane.shape:
+                    np.copyto(plane, result, casting="unsafe")
+                    planes.append(name)
+                else:
+                    results[name] = result
+            views.set_frame(None)
+            channels.inferred.put((slot, index, when, results, tuple(planes)))
+    finally:
+        frames.close()
+
+
+def _compositing_main(frames: SharedFrames, previews: SharedFrames, channels: Channels, config: dict,
+                      sink, props: dict, filters: tuple, preview: bool, stream: bool):
+    Configuration.data = config
+    worker = CompositingWorker(frames, previews, channels, sink, props, preview, stream)
+    try:
+        worker.prepare()
+        worker.filters = filters
+    except CameraError as e:
+        channels.status.put(("error", str(e)))
+        return
+    channels.status.put(("output", worker.output_cam_properties))
+    worker.run()
+
+
+class RemoteMiddleware:
+    """
+    Middleware computed by inference process, get() returns its result of current frame.
+    Frame which came without the result (middleware just activated, failed or used only by
+    drivers) is computed by own instance in compositing process.
+    """
+
+    tracer = NULL_TRACER
+
+    def __init__(self, name: str, load):
+        self.name = name
+        self._load = load
+        self._local = None
+        self._done = False
+        self._result = None
+        self._frame = None
+        self._index = None
+        self._views = None
+        self.result_index = None
+        self.pipeline = None
+
+    def set_frame(self, frame, index=None, views=None):
+        self._frame = frame
+        self._index = index
+        self._views = views
+        self._done = False
+
+    def set_result(self, result, index):
+        self._result, self.result_index = result, index
+        self._done = True
+
+    def get(self):
+        if not self._done:
+            if self._frame is None:
+                raise ValueError("self.frame is None. Probably set_frame() was never called.")
+            if self._local is None:
+                self._local = self._load(self.name)
+                self._local.tracer = self.tracer
+            self.set_result(self._local.compute(self._frame, self._views), self._index)
+        return self._result
+
+    def peek(self):
+        "Same as Middleware.peek()."
+        if self._done:
+            return self._result, self.result_index
+        return None
+
+
+class CompositingWorker(CamerasWorker):
+    """
+    Filters, drivers and output of ProcessWorker, run in compositing process.
+    Frames come in slots of SharedFrames with middleware results, filters don't modify
+    the slot (first one writes into scratch buffer), so middleware computed here sees raw frame.
+    """
+
+    STATS_INTERVAL = 1.
+
+    def __init__(self, frames: SharedFrames, previews: SharedFrames, channels: Channels,
+                 sink, props: dict, preview=True, stream=True):
+        super().__init__(None, sink, preview=preview, stream=stream)
+        self.frames = frames
+        self.previews = previews
+        self.channels = channels
+        self._input_props = props
+        self._required = None
+        self._dropped = 0
+
+    @property
+    def queue_stats(self) -> dict:
+        "Frames dropped because compositing was behind and stale frames."
+        return {"dropped": self._dropped, "stale": self._stale_frames}
+
+    def prepare(self):
+        self._output_cam, self._output_props = start_output(self.out_cam_name, **self._input_props)
+        self.resolution = (self._input_props["width"], self._input_props["height"])
+        self._prepare_modules()
+
+    def _load_middleware(self, name: str):
+        with self._load_lock:
+            if name in self._middleware:
+                return dict.__getitem__(self._middleware, name)
+            mdl = RemoteMiddleware(name, self._create_middleware)
+            mdl.tracer = self.tracer
+            if self.views.frame is not None:
+                mdl.set_frame(self.views.frame, self.views.index, self.views)
+            self._middleware[name] = mdl
+            return mdl
+
+    def _require(self):
+        """
+        Sends names of middleware used by active filters to inference. Middleware used only
+        by drivers is computed here when they tick, not for every frame by inference.
+        """
+        names = set()
+        for name in self._active_filters:
+            names.update(PLUGINS.get("Filter", name).requires)
+            region = self.config["filter_regions"].get(name)
+            if isinstance(region, str) and region in RegionFilter.REQUIRES:
+                names.add(RegionFilter.REQUIRES[region])
+        names = tuple(sorted(names))
+        if names != self._required:
+            self._required = names
+            self.channels.require.put(names)
+
+    def _control(self):
+        "Applies changes requested by ProcessWorker."
+        try:
+            while True:
+                attribute, value = self.channels.control.get_nowait()
+                setattr(self, attribute, value)
+        except queue.Empty:
+            pass
+
+    def _send(self, frame: np.array):
+        if self._streaming:
+            with self.tracer.span("send", "output"):
+                self._output_cam.send(frame)
+        if self._preview and frame.shape == self.previews.shape:
+            try:
+                slot = self.channels.preview_free.get_nowait()
+            except queue.Empty:
+                # preview isn't read
+                return
+            np.copyto(self.previews.frames[slot], frame)
+            self.channels.preview_ready.put((slot, self._frame_index))
+
+    def _process(self, slot: int, index: int, when: float, results: dict, planes: tuple, scratch_pool: FramePool):
+        frame = self.frames.frames[slot]
+        self._frame_index = index
+        self.frame_time = when
+        self.tracer.frame = index
+        with self.tracer.span("frame", "frame", latency=time.perf_counter() - when):
+            self.views.set_frame(frame, index)
+            for name, mdl in list(self._middleware.items()):
+                mdl.set_frame(frame, index, self.views)
+                if name in planes:
+                    # filters and drivers keep masks, slot is overwritten after this frame
+                    mdl.set_result(self.frames.masks[slot][name].copy(), index)
+                elif name in results:
+                    mdl.set_result(results[name], index)
+
+            output = self._apply_plan(frame, scratch_pool, owned=False)
+            self._send(output)
+            # preview got a copy
+            scratch_pool.release(output)
+
+            if self._scheduler is not None:
+                with self.tracer.span("snapshot", "driver"):
+                    self._scheduler.collect(self._middleware, when)
+        self.views.set_frame(None)
+
+    def run(self):
+        "Processes frames until stop is requested."
+        channels = self.channels
+        max_error_frames = self.config["error_frames_max"]
+        frame_delay_max = self.config["frame_delay_max"]
+        scratch_pool = FramePool(self.frames.shape, 2)
+        if self._drivers:
+            self._scheduler = DriverScheduler(self, self._drivers, self.tracer)
+            self._scheduler.start()
+
+        error_counter = 0
+        reported = self._active_filters
+        next_stats = 0.
+        try:
+            while not channels.stop.is_set():
+                self._control()
+                filters = self._active_filters
+                if self._plan is None or self._plan[0] is not filters:
+                    self._plan = (filters, self._make_plan(filters))
+                    self._require()
+                if filters is not reported:
+                    # can be changed by drivers
+                    reported = filters
+                    channels.status.put(("filters", filters))
+                now = time.perf_counter()
+                if now >= next_stats:
+                    next_stats = now + self.STATS_INTERVAL
+                    channels.status.put(("stats", self.queue_stats))
+
+                item, skipped = newest(channels.inferred, channels.free, 0.1)
+                self._dropped += skipped
+                if item is None:
+                    continue
+                slot, index, when, results, planes = item
+                try:
+                    if (time.perf_counter() - when) > frame_delay_max:
+                        self._stale_frames += 1
+                        continue
+                    self._process(slot, index, when, results, planes, scratch_pool)
+                except Exception as e:
+                    logger.warning("Badly processed of frame. %d until stop. %s: %s",
+                        max_error_frames - error_counter, e, ", ".join(str(a) for a in e.args))
+                    if error_counter > max_error_frames:
+                        channels.status.put(("error", f"{e}: {', '.join(str(a) for a in e.args)}"))
+                        break
+                    error_counter += 1
+                finally:
+                    channels.free.put(slot)
+        finally:
+            self._release()
+            self.frames.close()
+            self.previews.close()
+
+
+class ProcessWorker:
+    """
+    CamerasWorker running capture, middleware inference and compositing in separate
+    processes (see module docstring). Interface is the same, frames of preview are copies.
+    Output which doesn't depend on camera (Away) isn't throttled in this mode.
+    """
+
+    CONFIG_TEMPLATE = {
+        "enabled": False,
+        # frames being captured, computed and composited
+        "slots": 6,
+        "preview_slots": 3,
+        # middleware with float mask of frame size passed in shared memory
+        "planes": ["Selfie"],
+        "start_timeout": 20.,
+        "stop_timeout": 5.
+    }
+
+    def __init__(self, in_cam, out_cam, width=None, height=None, fps=None, preview=True, stream=True):
+        self.config = Configuration.get_custom_config(self.__class__)
+        self.in_cam_name = in_cam
+        self.out_cam_name = out_cam
+        self._setup_data = {"width": width, "height": height, "fps": fps}
+        self._input_props = None
+        self._output_props = None
+        self.resolution = None
+        self._preview = bool(preview)
+        self._streaming = bool(stream)
+        self._active_filters = tuple()
+        self._context = mp.get_context("spawn")
+        self._channels = None
+        self._processes = []
+        self._frames = None
+        self._previews = None
+        self._stats = {}
+        self._errors = []
+
+    def _set(self, attribute: str, value):
+        if self._channels is not None:
+            self._channels.control.put((attribute, value))
+
+    @property
+    def filters(self):
+        self._poll()
+        return self._active_filters
+
+    @filters.setter
+    def filters(self, filters):
+        self._active_filters = tuple(filters)
+        self._set("filters", self._active_filters)
+        logger.info("Filters changed to: %s", self._active_filters)
+
+    @property
+    def preview(self):
+        return self._preview
+
+    @preview.setter
+    def preview(self, preview):
+        self._preview = bool(preview)
+        self._set("preview", self._preview)
+        logger.info("Preview is%ssend.", " " if self._preview else " not ")
+
+    @property
+    def streaming(self):
+        return self._streaming
+
+    @streaming.setter
+    def streaming(self, stream):
+        self._streaming = bool(stream)
+        self._set("streaming", self._streaming)
+        logger.info("%streaming.", "S" if self._streaming else "Not s")
+
+    @property
+    def input_cam_properties(self):
+        return self._input_props
+
+    @property
+    def output_cam_properties(self):
+        return self._output_props
+
+    @property
+    def queue_stats(self) -> dict:
+        "Stats of compositing process, updated every second."
+        self._poll()
+        return self._stats
+
+    def _handle(self, kind: str, data):
+        if kind == "stats":
+            self._stats = data
+        elif kind == "filters":
+            self._active_filters = data
+        elif kind == "error":
+            self._errors.append(data)
+
+    def _poll(self):
+        "Handles messages of processes."
+        if self._channels is None:
+            return
+        try:
+            while True:
+                self._handle(*self._channels.status.get_nowait())
+        except queue.Empty:
+            pass
+
+    def _wait(self, expected: str):
+        "Waits for message `expected` of processes."
+        deadline = time.perf_counter() + self.config["start_timeout"]
+        while True:
+            try:
+                kind, data = self._channels.status.get(timeout=0.1)
+            except queue.Empty:
+                if any(not p.is_alive() for p in self._processes):
+                    raise CameraError("Worker process ended unexpectedly.")
+                if time.perf_counter() > deadline:
+                    raise CameraError(f"Worker processes didn't start in {self.config['start_timeout']}s.")
+                continue
+            if kind == "error":
+                raise CameraError(data)
+            if kind == expected:
+                return data
+            self._handle(kind, data)
+
+    def _spawn(self, target, name: str, *args):
+        process = self._context.Process(target=target, name=name, args=args, daemon=True)
+        process.start()
+        self._processes.append(process)
+
+    def start(self):
+        channels = self._channels = Channels(self._context)
+        config = Configuration.data
+        try:
+            self._spawn(_capture_main, "capture", self.in_cam_name, self._setup_data, channels, config)
+            self._input_props = self._wait("input")
+            self.resolution = (self._input_props["width"], self._input_props["height"])
+            shape = (self.resolution[1], self.resolution[0], 3)
+            self._frames = SharedFrames(shape, self.config["slots"], self.config["planes"])
+            self._previews = SharedFrames(shape, self.config["preview_slots"])
+            for slot in range(self._frames.count):
+                channels.free.put(slot)
+            for slot in range(self._previews.count):
+                channels.preview_free.put(slot)
+            channels.setup.put(self._frames)
+            self._spawn(_inference_main, "inference", self._frames, channels, config)
+            self._spawn(_compositing_main, "compositing", self._frames, self._previews, channels, config,
+                        self.out_cam_name, self._input_props, self._active_filters, self._preview, self._streaming)
+            self._output_props = self._wait("output")
+        except Exception:
+            self.stop()
+            raise
+        logger.info("Started aquisition in processes.")
+
+    def stop(self):
+        logger.info("Stopping aquisition.")
+        if self._channels is not None:
+            self._channels.stop.set()
+        while self._processes:
+            process = self._processes.pop()
+            process.join(self.config["stop_timeout"])
+            if process.is_alive():
+                logger.warning("Process '%s' didn't stop, terminating.", process.name)
+                process.terminate()
+                process.join()
+        self._poll()
+        self._channels = None
+        for frames in (self._frames, self._previews):
+            if frames is not None:
+                frames.close()
+                frames.unlink()
+        self._frames = self._previews = None
+        logger.info("Stoped. Queues: %s", self._stats)
+
+    def get_frame(self, block=True, timeout: int = 0.1) -> Optional[np.array]:
+        if not self.preview:
+            raise CameraError("Preview disabled.")
+        self._poll()
+        if self._errors:
+            raise CameraError(f"Error in ProcessWorker processes: {self._errors.pop()}")
+        if self._channels is None:
+            raise CameraError("Unable to fetch frame.")
+        channels = self._channels
+        item, _ = newest(channels.preview_ready, channels.preview_free, timeout if block else 0.)
+        if item is None:
+            return None
+        frame = self._previews.frames[item[0]].copy()
+        channels.preview_free.put(item[0])
+        return frame
+
+Configuration.CUSTOM_CLASSES.append(ProcessWorker)
@@ -0,0 +1,138 @@
+import os, sys, json, time, builtins, threading, importlib.util
+from collections import deque
+from contextlib import contextmanager, nullcontext
+from pathlib import Path
+from typing import Union
+
+
+class Tracer:
+    """
+    Records spans of pipeline stages per thread.
+    Exports Chrome trace-event JSON (chrome://tracing, https://ui.perfetto.dev).
+    """
+
+    enabled = True
+
+    def __init__(self, max_events: int = 500000):
+        self.events = deque(maxlen=max_events)
+        self.frame = None
+        self._origin = time.perf_counter()
+        self._local = threading.local()
+        self._threads = {}
+
+    def _stack(self) -> list:
+        try:
+            return self._local.stack
+        except AttributeError:
+            self._local.stack = []
+            self._threads[threading.get_ident()] = threading.current_thread().name
+            return self._local.stack
+
+    @property
+    def current(self):
+        "Name of innermost open span in this thread."
+        stack = self._stack()
+        return stack[-1] if stack else None
+
+    @contextmanager
+    def span(self, name: str, cat: str = "stage", **args):
+        stack = self._stack()
+        if stack:
+            args["parent"] = stack[-1]
+        if self.frame is not None:
+            args["frame"] = self.frame
+        stack.append(name)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            end = time.perf_counter()
+            stack.pop()
+            self.events.append((name, cat, start, end, threading.get_ident(), args))
+
+    def to_dict(self) -> dict:
+        pid = os.getpid()
+        events = [
+            {"name": "thread_name", "ph": "M", "pid": pid, "tid": tid, "args": {"name": name}}
+            for tid, name in self._threads.items()
+        ]
+        for name, cat, start, end, tid, args in list(self.events):
+            events.append({
+                "name": name,
+                "cat": cat,
+                "ph": "X",
+                "ts": (start - self._origin) * 1e6,
+                "dur": (end - start) * 1e6,
+                "pid": pid,
+                "tid": tid,
+                "args": args
+            })
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+    def export(self, path: Union[str, Path]):
+        with open(path, "w") as fh:
+            json.dump(self.to_dict(), fh)
+
+
+class NullTracer:
+    "Tracer doing nothing. Used when tracing is disabled."
+
+    enabled = False
+    frame = None
+    current = None
+    _span = nullcontext()
+
+    def span(self, name, cat="stage", **args):
+        return self._span
+
+
+NULL_TRACER = NullTracer()
+
+
+class ImportTimer:
+    """
+    Measures time of module imports, like `python -X importtime`, by wrapping __import__.
+    Self time excludes nested imports. Modules imported by importlib.import_module are not seen.
+    """
+
+    def __init__(self):
+        self.records = []
+        self.start = time.perf_counter()
+        self._original = None
+        self._stack = []
+
+    def install(self) -> "ImportTimer":
+        self._original = builtins.__import__
+        builtins.__import__ = self._import
+        return self
+
+    def uninstall(self):
+        if self._original is not None:
+            builtins.__import__ = self._original
+            self._original = None
+
+    def _import(self, name, globals=None, locals=None, fromlist=(), level=0):
+        try:
+            fullname = importlib.util.resolve_name("." * level + name, (globals or {}).get("__package__")) if level else name
+        except (ImportError, ValueError):
+            fullname = name
+        if fullname in sys.modules or self._original is None:
+            return (self._original or builtins.__import__)(name, globals, locals, fromlist, level)
+        self._stack.append(0.)
+        start = time.perf_counter()
+        try:
+            return self._original(name, globals, locals, fromlist, level)
+        finally:
+            cumulative = time.perf_counter() - start
+            nested = self._stack.pop()
+            if self._stack:
+                self._stack[-1] += cumulative
+            self.records.append((fullname, cumulative - nested, cumulative, len(self._stack)))
+
+    def report(self, limit: int = 20) -> str:
+        "Slowest imports by cumulative time and total time since timer creation."
+        lines = ["import time: self [ms] | cumulative [ms] | module"]
+        for name, own, cumulative, depth in sorted(self.records, key=lambda r: -r[2])[:limit]:
+            lines.append("%17.1f | %16.1f | %s%s" % (own * 1e3, cumulative * 1e3, "  " * depth, name))
+        lines.append("total: %.3f s" % (time.perf_counter() - self.start))
+        return "\n".join(lines)
@@ -0,0 +1,163 @@
+"""
+Registry of filters, middleware and drivers.
+
+Plugins are described without importing them. Built-in modules and modules of installed
+packages registered under entry point groups (see ENTRY_POINTS) are read as source code,
+so name, group, CONFIG_TEMPLATE and REQUIRES are known before the class gets imported
+(which may pull mediapipe, numba...). Class is imported by load() when it's activated.
+
+Third-party package registers its filter in setup.py:
+
+    entry_points={"webcamenhancer.filters": ["MyFilter = my_package.filters:MyFilter"]}
+"""
+import ast, importlib, importlib.util
+from importlib.metadata import entry_points
+from typing import Optional
+
+from .base import ModuleController
+from .utils import logger
+
+GROUPS = ("Middleware", "Filter", "Driver")
+ENTRY_POINTS = {
+    "Middleware": "webcamenhancer.middleware",
+    "Filter": "webcamenhancer.filters",
+    "Driver": "webcamenhancer.drivers"
+}
+BUILTIN = (
+    "WebCamEnhancer.modules.middleware",
+    "WebCamEnhancer.modules.filters",
+    "WebCamEnhancer.modules.drivers"
+)
+
+
+class PluginDescriptor:
+    "Lightweight description of plugin class. load() imports it."
+
+    def __init__(self, name: str, group: str, module: str, config_template: Optional[dict] = None,
+                 requires: tuple = (), doc: str = "", klass=None):
+        self.name = name
+        self.group = group
+        self.module = module
+        self.requires = tuple(requires)
+        self.doc = doc
+        self._config_template = config_template
+        self._class = klass
+
+    def __repr__(self):
+        return f"<{self.group} '{self.name}' from {self.module}>"
+
+    @property
+    def loaded(self) -> bool:
+        return self._class is not None
+
+    @property
+    def CONFIG_TEMPLATE(self) -> dict:
+        # templates which are not literals can be known only from the class
+        if self._config_template is None:
+            self._config_template = self.load().CONFIG_TEMPLATE
+        return self._config_template
+
+    def load(self):
+        "Imports the class."
+        if self._class is None:
+            module = importlib.import_module(self.module)
+            self._class = getattr(module, self.name)
+        return self._class
+
+    @classmethod
+    def from_class(cls, klass) -> "PluginDescriptor":
+        return cls(klass.__name__, klass.__mro__[1].__name__, klass.__module__, klass.CONFIG_TEMPLATE,
+                   getattr(klass, "REQUIRES", ()), klass.__doc__ or "", klass)
+
+
+def _literal(node, default=None):
+    try:
+        return ast.literal_eval(node)
+    except (ValueError, TypeError, SyntaxError):
+        return default
+
+
+def scan_module(module: str, names: Optional[set] = None) -> list[PluginDescriptor]:
+    "Descriptors of plugin classes found in source code of module. Module is not executed."
+    spec = importlib.util.find_spec(module)
+    if spec is None or not spec.origin or not spec.origin.endswith(".py"):
+        raise ImportError(f"Source of '{module}' not found.")
+    with open(spec.origin, encoding="utf-8") as fh:
+        tree = ast.parse(fh.read(), spec.origin)
+
+    descriptors = []
+    for node in tree.body:
+        if not isinstance(node, ast.ClassDef) or (names is not None and node.name not in names):
+            continue
+        groups = [b.id for b in node.bases if isinstance(b, ast.Name) and b.id in GROUPS]
+        if not groups:
+            continue
+        template, requires = {}, ()
+        for item in node.body:
+            if isinstance(item, ast.Assign) and len(item.targets) == 1 and isinstance(item.targets[0], ast.Name):
+                if item.targets[0].id == "CONFIG_TEMPLATE":
+                    template = _literal(item.value)
+                elif item.targets[0].id == "REQUIRES":
+                    requires = _literal(item.value, ())
+        descriptors.append(PluginDescriptor(
+            node.name, groups[0], module, template, requires, ast.get_docstring(node) or ""))
+    return descriptors
+
+
+class Registry:
+    "Descriptors of all available plugins by group and name."
+
+    def __init__(self, builtin=BUILTIN, entry_point_groups=ENTRY_POINTS):
+        self.builtin = builtin
+        self.entry_point_groups = entry_point_groups
+        self._plugins = None
+
+    def discover(self):
+        plugins = {group: {} for group in GROUPS}
+        for module in self.builtin:
+            try:
+                for d in scan_module(module):
+                    plugins[d.group][d.name] = d
+            except (ImportError, SyntaxError, OSError) as e:
+                logger.warning("Unable to scan plugins of '%s': %s", module, e)
+
+        for group, ep_group in self.entry_point_groups.items():
+            for ep in entry_points(group=ep_group):
+                try:
+                    found = scan_module(ep.module, {ep.attr})
+                except (ImportError, SyntaxError, OSError):
+                    found = []
+                if found:
+                    plugins[group][ep.name] = found[0]
+                    continue
+                # describe by import if source can't be read
+                try:
+                    plugins[group][ep.name] = PluginDescriptor.from_class(ep.load())
+                except Exception as e:
+                    logger.warning("Unable to load plugin '%s' of '%s': %s", ep.name, ep_group, e)
+        self._plugins = plugins
+
+    def _group(self, group: str) -> dict:
+        if self._plugins is None:
+            self.discover()
+        # classes registered by import only (e.g. defined in scripts) are known too
+        for klass in ModuleController.MODULES.get(group, []):
+            if klass.__name__ not in self._plugins[group]:
+                self._plugins[group][klass.__name__] = PluginDescriptor.from_class(klass)
+        return self._plugins[group]
+
+    def descriptors(self, group: str) -> list[PluginDescriptor]:
+        return sorted(self._group(group).values(), key=lambda d: d.name)
+
+    def get(self, group: str, name: str) -> PluginDescriptor:
+        try:
+            return self._group(group)[name]
+        except KeyError:
+            raise KeyError(f"Unknown {group} '{name}'.")
+
+    def load(self, group: str, name: str):
+        return self.get(group, name).load()
+
+
+# one global
+PLUGINS = Registry()
@@ -0,0 +1,109 @@
+import threading, time
+
+from .profiling import NULL_TRACER
+from .utils import logger
+
+
+class Snapshot:
+    """
+    State of the worker after processing of one frame, given to Driver.resolve().
+    `results` holds middleware results of that frame: ones required by due drivers
+    (missing when middleware failed) and ones which filters computed anyway.
+    """
+
+    def __init__(self, index: int, time: float, latency: float, filters: tuple, results: dict, stats: dict):
+        self.index = index
+        self.time = time
+        self.latency = latency
+        self.filters = filters
+        self.results = results
+        self.stats = stats
+
+
+class DriverScheduler:
+    """
+    Runs Driver.resolve() on its own thread, each driver `tick_rate` times a second.
+
+    When some driver is due, processing thread is asked for a Snapshot of next processed frame
+    (collect()). Middleware required by due drivers is computed then, so it runs at tick rate of
+    drivers instead of every frame. Drivers change filters through CamerasWorker.filters,
+    new chain is used from the next frame.
+    """
+
+    SNAPSHOT_TIMEOUT = 1.
+
+    def __init__(self, worker, drivers: dict, tracer=NULL_TRACER):
+        self.worker = worker
+        self.drivers = drivers
+        self.tracer = tracer
+        self.ticks = 0
+        self._next = {}
+        self._due = ()
+        self._snapshot = None
+        self._cond = threading.Condition()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        now = time.perf_counter()
+        self._next = {name: now for name in self.drivers}
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._worker, name="drivers", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        with self._cond:
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def collect(self, middleware: dict, when: float):
+        "Called by processing thread after each frame. Cheap unless some driver is due."
+        due = self._due
+        if not due or self._snapshot is not None:
+            return
+        results = {}
+        for name in {m for d in due for m in self.drivers[d].requires}:
+            try:
+                results[name] = middleware[name].get()
+            except Exception as e:
+                # drivers must not break the stream, they get no result
+                logger.warning("Middleware '%s' for drivers failed: %s", name, e)
+        for name, mdl in list(middleware.items()):
+            if name not in results:
+                item = mdl.peek()
+                if item is not None:
+                    results[name] = item[0]
+        worker = self.worker
+        snapshot = Snapshot(worker.frame_index, when, time.perf_counter() - when, worker.filters, results, worker.queue_stats)
+        with self._cond:
+            self._snapshot = snapshot
+            self._cond.notify_all()
+
+    def _worker(self):
+        while not self._stop.is_set():
+            now = time.perf_counter()
+            wait = min(self._next.values(), default=now + 1.) - now
+            if wait > 0:
+                self._stop.wait(wait)
+                continue
+            due = tuple(name for name, at in self._next.items() if at <= now)
+            with self._cond:
+                self._snapshot = None
+                self._due = due
+                self._cond.wait_for(lambda: self._snapshot is not None or self._stop.is_set(), self.SNAPSHOT_TIMEOUT)
+                snapshot, self._snapshot, self._due = self._snapshot, None, ()
+            if snapshot is None:
+                # no frames processed meanwhile, try again later
+                continue
+            for name in due:
+                drv = self.drivers[name]
+                self._next[name] = max(self._next[name] + 1. / drv.tick_rate, now)
+                try:
+                    with self.tracer.span(name, "driver"):
+                        drv.resolve(snapshot)
+                except Exception as e:
+                    logger.warning("Driver '%s' failed: %s", name, e)
+            self.ticks += 1
@@ -0,0 +1,187 @@
+import cv2, pyvirtualcam, time
+import numpy as np
+from typing import Optional, Union, Iterable
+from pathlib import Path
+
+
+class SinkError(Exception):
+    pass
+
+
+class FrameSink:
+    """
+    Destination of processed BGR frames.
+    Interface mimics pyvirtualcam.Camera: open() -> properties, send(frame), close().
+    """
+
+    def __init__(self, width: int, height: int, fps: Optional[float] = None):
+        self.width = int(width)
+        self.height = int(height)
+        self.fps = fps or 30.
+
+    @property
+    def properties(self) -> dict:
+        return {"width": self.width, "height": self.height, "fps": self.fps}
+
+    def open(self) -> dict:
+        return self.properties
+
+    def send(self, frame: np.array):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class VirtualCamSink(FrameSink):
+    "Loopback device through pyvirtualcam."
+
+    def __init__(self, device: str, width, height, fps=None,
+                 pixel_format: pyvirtualcam.PixelFormat = pyvirtualcam.PixelFormat.BGR):
+        super().__init__(width, height, fps)
+        self.device = device
+        self.pixel_format = pixel_format
+        self._cam = None
+
+    def open(self) -> dict:
+        if not Path(self.device).exists():
+            raise SinkError(f"Invalid output device: '{self.device}'")
+        try:
+            self._cam = pyvirtualcam.Camera(width=self.width, height=self.height, fps=self.fps,
+                                            fmt=self.pixel_format, device=self.device)
+        except RuntimeError as r:
+            raise SinkError(f"Failed to connect to output device: '{self.device}'. {r}")
+        self.width, self.height, self.fps = self._cam.width, self._cam.height, self._cam.fps
+        return self.properties
+
+    def send(self, frame):
+        self._cam.send(frame)
+
+    def close(self):
+        if self._cam is not None:
+            self._cam.close()
+
+
+class NullSink(FrameSink):
+    "Discards frames. Counts them and measures time spent in send()."
+
+    def __init__(self, width, height, fps=None):
+        super().__init__(width, height, fps)
+        self.frames = 0
+        self.send_time = 0.
+        self.send_time_max = 0.
+        self._first = None
+        self._last = None
+
+    def send(self, frame):
+        start = time.perf_counter()
+        if self._first is None:
+            self._first = start
+        self.frames += 1
+        self._last = time.perf_counter()
+        spent = self._last - start
+        self.send_time += spent
+        self.send_time_max = max(self.send_time_max, spent)
+
+    @property
+    def stats(self) -> dict:
+        elapsed = (self._last - self._first) if self.frames > 1 else 0.
+        return {
+            "frames": self.frames,
+            "fps": (self.frames - 1) / elapsed if elapsed else 0.,
+            "send_time_mean": self.send_time / self.frames if self.frames else 0.,
+            "send_time_max": self.send_time_max
+        }
+
+
+class FileSink(FrameSink):
+    "Writes raw BGR bytes (.raw, .bgr) or encoded video through cv2.VideoWriter."
+
+    RAW_SUFFIXES = (".raw", ".bgr")
+    FOURCC = {".avi": "MJPG", ".mp4": "mp4v", ".mkv": "XVID"}
+
+    def __init__(self, path: Union[str, Path], width, height, fps=None):
+        super().__init__(width, height, fps)
+        self.path = Path(path)
+        self._fh = None
+        self._writer = None
+
+    def open(self) -> dict:
+        suffix = self.path.suffix.lower()
+        if suffix in self.RAW_SUFFIXES:
+            self._fh = open(self.path, "wb")
+        elif suffix in self.FOURCC:
+            self._writer = cv2.VideoWriter(str(self.path), cv2.VideoWriter_fourcc(*self.FOURCC[suffix]),
+                                           self.fps, (self.width, self.height))
+            if not self._writer.isOpened():
+                raise SinkError(f"Unable to open video writer for '{self.path}'")
+        else:
+            raise SinkError(f"Unsupported output file type '{self.path.suffix}'")
+        return self.properties
+
+    def send(self, frame):
+        if self._fh is not None:
+            self._fh.write(np.ascontiguousarray(frame).data)
+        else:
+            self._writer.write(frame)
+
+    def close(self):
+        if self._fh is not None:
+            self._fh.close()
+        if self._writer is not None:
+            self._writer.release()
+
+
+class TeeSink(FrameSink):
+    "Sends each frame to all sinks. Properties are taken from the first one."
+
+    def __init__(self, sinks: Iterable[FrameSink]):
+        self.sinks = list(sinks)
+        if not self.sinks:
+            raise SinkError("TeeSink needs at least one sink.")
+        first = self.sinks[0]
+        super().__init__(first.width, first.height, first.fps)
+
+    def open(self) -> dict:
+        opened = []
+        try:
+            for sink in self.sinks:
+                sink.open()
+                opened.append(sink)
+        except SinkError:
+            for sink in opened:
+                sink.close()
+            raise
+        self.width, self.height, self.fps = self.sinks[0].width, self.sinks[0].height, self.sinks[0].fps
+        return self.properties
+
+    def send(self, frame):
+        for sink in self.sinks:
+            sink.send(frame)
+
+    def close(self):
+        for sink in self.sinks:
+            sink.close()
+
+
+def make_sink(spec: Union[FrameSink, str, Path, Iterable], width: int, height: int,
+              fps: Optional[float] = None) -> FrameSink:
+    """
+    Creates frame sink from specification:
+      - FrameSink instance is used as is,
+      - list of specifications or comma separated string: TeeSink,
+      - "null": NullSink,
+      - video or raw file path: FileSink,
+      - anything else is loopback device for pyvirtualcam.
+    """
+    if isinstance(spec, FrameSink):
+        return spec
+    if isinstance(spec, (list, tuple)) or (isinstance(spec, str) and "," in spec):
+        parts = spec.split(",") if isinstance(spec, str) else spec
+        return TeeSink(make_sink(part.strip() if isinstance(part, str) else part, width, height, fps) for part in parts)
+    if str(spec) == "null":
+        return NullSink(width, height, fps)
+    suffix = Path(spec).suffix.lower()
+    if suffix in FileSink.RAW_SUFFIXES or suffix in FileSink.FOURCC:
+        return FileSink(spec, width, height, fps)
+    return VirtualCamSink(str(spec), width, height, fps)
@@ -0,0 +1,370 @@
+import cv2, time, threading, queue
+import numpy as np
+from typing import Optional, Union
+from pathlib import Path
+
+from .buffers import FrameQueue, FramePool
+from .utils import logger
+
+
+class SourceError(Exception):
+    pass
+
+
+class FrameSource:
+    """
+    Source of BGR frames consumed by CamerasWorker.
+    Interface mimics cv2.VideoCapture: open() -> properties, read() -> (ret, frame), release().
+    """
+
+    def __init__(self, width: Optional[int] = None, height: Optional[int] = None,
+                 fps: Optional[float] = None, realtime: bool = True):
+        self.width = width
+        self.height = height
+        self.fps = fps
+        self.realtime = realtime
+        self._next_time = None
+
+    @property
+    def properties(self) -> dict:
+        return {"width": int(self.width), "height": int(self.height), "fps": self.fps}
+
+    def open(self) -> dict:
+        return self.properties
+
+    def read(self, out: Optional[np.array] = None) -> tuple[bool, Optional[np.array]]:
+        "Reads next frame. Decodes into `out` when it has matching shape."
+        raise NotImplementedError
+
+    def release(self):
+        pass
+
+    def isOpened(self) -> bool:
+        return True
+
+    def _pace(self):
+        "Sleeps to keep `fps` if source is realtime."
+        if not self.realtime or not self.fps:
+            return
+        now = time.perf_counter()
+        if self._next_time is None or now - self._next_time > 1.:
+            self._next_time = now
+        elif self._next_time > now:
+            time.sleep(self._next_time - now)
+        self._next_time += 1. / self.fps
+
+    def _fit(self, frame: np.array, out: Optional[np.array] = None) -> np.array:
+        "Resizes frame to requested resolution and drops alpha channel."
+        if frame.ndim == 2:
+            frame = cv2.cvtColor(frame, cv2.COLOR_GRAY2BGR)
+        elif frame.shape[2] == 4:
+            frame = cv2.cvtColor(frame, cv2.COLOR_BGRA2BGR)
+        if (frame.shape[1], frame.shape[0]) != (self.width, self.height):
+            frame = cv2.resize(frame, (int(self.width), int(self.height)), dst=out, interpolation=cv2.INTER_AREA)
+        return frame
+
+
+class CameraSource(FrameSource):
+    "Physical camera through cv2.VideoCapture."
+
+    def __init__(self, device: Union[int, str], width=None, height=None, fps=None):
+        super().__init__(width, height, fps, realtime=False)
+        self.device = device
+        self._cam = None
+
+    def open(self) -> dict:
+        self._cam = cv2.VideoCapture(self.device)
+        if not self._cam.isOpened():
+            raise SourceError(f"Unable to capture input device '{self.device}'")
+        if self.width is not None:
+            self._cam.set(cv2.CAP_PROP_FRAME_WIDTH, self.width)
+        if self.height is not None:
+            self._cam.set(cv2.CAP_PROP_FRAME_HEIGHT, self.height)
+        if self.fps is not None:
+            self._cam.set(cv2.CAP_PROP_FPS, self.fps)
+
+        self.width, self.height, self.fps = (
+            int(self._cam.get(cv2.CAP_PROP_FRAME_WIDTH)),
+            int(self._cam.get(cv2.CAP_PROP_FRAME_HEIGHT)),
+            self._cam.get(cv2.CAP_PROP_FPS)
+        )
+        return self.properties
+
+    def read(self, out=None):
+        return self._cam.read(out)
+
+    def release(self):
+        if self._cam is not None:
+            self._cam.release()
+
+    def isOpened(self):
+        return self._cam is not None and self._cam.isOpened()
+
+
+class VideoFileSource(FrameSource):
+    "Video file decoded by cv2.VideoCapture. Paced to its fps when realtime."
+
+    def __init__(self, path: Union[str, Path], width=None, height=None, fps=None, loop=True, realtime=True):
+        super().__init__(width, height, fps, realtime)
+        self.path = Path(path)
+        self.loop = loop
+        self._cap = None
+        self._native = False
+
+    def open(self) -> dict:
+        self._cap = cv2.VideoCapture(str(self.path))
+        if not self._cap.isOpened():
+            raise SourceError(f"Unable to open video file '{self.path}'")
+        self.width = self.width or int(self._cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+        self.height = self.height or int(self._cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        self.fps = self.fps or self._cap.get(cv2.CAP_PROP_FPS) or 30.
+        self._native = (self.width, self.height) == (
+            int(self._cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(self._cap.get(cv2.CAP_PROP_FRAME_HEIGHT)))
+        return self.properties
+
+    def read(self, out=None):
+        # decode directly to `out` only when no resize is needed
+        ret, frame = self._cap.read(out if self._native else None)
+        if not ret and self.loop:
+            self._cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+            ret, frame = self._cap.read(out if self._native else None)
+        if not ret:
+            return False, None
+        self._pace()
+        return True, self._fit(frame, out)
+
+    def release(self):
+        if self._cap is not None:
+            self._cap.release()
+
+
+class ImageSequenceSource(FrameSource):
+    "Directory of images played in alphabetical order."
+
+    SUFFIXES = (".png", ".jpg", ".jpeg", ".bmp", ".tif", ".tiff", ".webp")
+
+    def __init__(self, directory: Union[str, Path], width=None, height=None, fps=None, loop=True, realtime=True):
+        super().__init__(width, height, fps or 30., realtime)
+        self.directory = Path(directory)
+        self.loop = loop
+        self._files = []
+        self._index = 0
+
+    def open(self) -> dict:
+        self._files = sorted(p for p in self.directory.iterdir() if p.suffix.lower() in self.SUFFIXES)
+        if not self._files:
+            raise SourceError(f"No images found in '{self.directory}'")
+        if self.width is None or self.height is None:
+            first = cv2.imread(str(self._files[0]), cv2.IMREAD_UNCHANGED)
+            if first is None:
+                raise SourceError(f"Unable to read image '{self._files[0]}'")
+            self.height, self.width = first.shape[:2]
+        self._index = 0
+        return self.properties
+
+    def read(self, out=None):
+        if self._index >= len(self._files):
+            if not self.loop:
+                return False, None
+            self._index = 0
+        frame = cv2.imread(str(self._files[self._index]), cv2.IMREAD_UNCHANGED)
+        self._index += 1
+        if frame is None:
+            return False, None
+        self._pace()
+        return True, self._fit(frame, out)
+
+
+class SyntheticSource(FrameSource):
+    """
+    Deterministic generated frames: gradient, moving shapes and a person-like sprite.
+    Frame content depends only on frame index and seed. Runs unpaced by default.
+    """
+
+    def __init__(self, width=None, height=None, fps=None, realtime=False, seed=0):
+        super().__init__(width or 640, height or 480, fps or 30., realtime)
+        self.seed = seed
+        self.index = 0
+
+    def open(self) -> dict:
+        w, h = int(self.width), int(self.height)
+        rng = np.random.default_rng(self.seed)
+        gradient = np.linspace(40, 200, w, dtype=np.float32)
+        self._background = np.empty((h, w, 3), np.uint8)
+        self._background[:] = np.stack((gradient, gradient[::-1], np.full(w, 90, np.float32)), axis=-1)
+        self._colors = [tuple(int(c) for c in rng.integers(0, 256, 3)) for _ in range(3)]
+        self._phases = rng.uniform(0, 2*np.pi, 3)
+        self.index = 0
+        return self.properties
+
+    def render(self, index: int, out: Optional[np.array] = None) -> np.array:
+        "Draws frame number `index`."
+        w, h = int(self.width), int(self.height)
+        unit = min(w, h)
+        t = index / self.fps
+        if out is not None and out.shape == self._background.shape:
+            frame = out
+            np.copyto(frame, self._background)
+        else:
+            frame = self._background.copy()
+
+        for i, (color, phase) in enumerate(zip(self._colors, self._phases)):
+            cx = int(w/2 + w*0.4*np.sin(t*(0.7 + 0.3*i) + phase))
+            cy = int(h/2 + h*0.4*np.cos(t*(0.5 + 0.2*i) + phase))
+            size = int(unit*(0.05 + 0.02*i))
+            if i % 2:
+                cv2.rectangle(frame, (cx - size, cy - size), (cx + size, cy + size), color, -1)
+            else:
+                cv2.circle(frame, (cx, cy), size, color, -1, cv2.LINE_AA)
+
+        self._draw_person(frame, t)
+        return frame
+
+    def _person(self, t: float) -> tuple:
+        "Center x, head center y, head axes and size unit of person at time t."
+        w, h = int(self.width), int(self.height)
+        unit = min(w, h)
+        cx = int(w/2 + w*0.1*np.sin(t*0.4))
+        head_y = int(h*0.38 + h*0.02*np.sin(t*1.3))
+        return cx, head_y, (int(unit*0.11), int(unit*0.14)), unit
+
+    def _draw_silhouette(self, image: np.array, t: float, colors: tuple):
+        cx, head_y, head, unit = self._person(t)
+        h = image.shape[0]
+        body, neck, face = colors
+        # shoulders and torso reaching the bottom edge
+        cv2.ellipse(image, (cx, h), (int(unit*0.33), int(h - head_y - head[1]*0.6)), 0, 180, 360, body, -1, cv2.LINE_AA)
+        cv2.rectangle(image, (cx - int(unit*0.04), head_y), (cx + int(unit*0.04), head_y + int(head[1]*1.4)), neck, -1)
+        cv2.ellipse(image, (cx, head_y), head, 0, 0, 360, face, -1, cv2.LINE_AA)
+
+    def _draw_person(self, frame: np.array, t: float):
+        self._draw_silhouette(frame, t, ((60, 50, 140), (120, 150, 200), (120, 160, 215)))
+        cx, head_y, head, unit = self._person(t)
+        # eyes and mouth
+        eye_y = head_y - head[1]//5
+        for dx in (-head[0]//2.5, head[0]//2.5):
+            cv2.circle(frame, (int(cx + dx), eye_y), max(1, head[0]//8), (40, 30, 30), -1, cv2.LINE_AA)
+        cv2.ellipse(frame, (cx, head_y + head[1]//2), (head[0]//2, head[1]//8), 0, 0, 180, (60, 60, 150), max(1, unit//160))
+
+    def truth(self, index: int) -> dict:
+        """
+        Ground truth of frame `index`: float32 person "mask" in range 0..1 (like Selfie)
+        and "faces" boxes (x, y, w, h) (like Cascade).
+        """
+        t = index / self.fps
+        mask = np.zeros((int(self.height), int(self.width)), np.uint8)
+        self._draw_silhouette(mask, t, (255, 255, 255))
+        cx, head_y, head, _ = self._person(t)
+        return {
+            "mask": mask.astype(np.float32) / 255.,
+            "faces": np.array([[cx - head[0], head_y - head[1], 2*head[0], 2*head[1]]], np.int32)
+        }
+
+    def read(self, out=None):
+        frame = self.render(self.index, out)
+        self.index += 1
+        self._pace()
+        return True, frame
+
+
+class PrefetchReader:
+    """
+    Decodes frames of `source` on its own thread into bounded buffer of `size` frames ahead.
+    read() never waits for decoding: it moves to next frame when its time came by fps
+    of the source, otherwise (or when decoder is behind) it returns the current frame again.
+    Returned frame stays valid until next read().
+    """
+
+    def __init__(self, source: FrameSource, size: int = 3):
+        self.source = source
+        self.source.realtime = False
+        self.size = size
+        self._queue = FrameQueue(size, "block")
+        self._stop = threading.Event()
+        self._thread = None
+        self._current = None
+        self._due = None
+
+    def start(self, timeout: float = 5.) -> dict:
+        "Opens source and waits for the first frame."
+        properties = self.source.open()
+        # queued frames, one being decoded and the current one
+        self._pool = FramePool((properties["height"], properties["width"], 3), self.size + 2)
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._worker, name="prefetch", daemon=True)
+        self._thread.start()
+        try:
+            self._current = self._queue.get(timeout=timeout)
+        except queue.Empty:
+            self.stop()
+            raise SourceError(f"No frame decoded from '{getattr(self.source, 'path', self.source)}'")
+        self._due = time.perf_counter() + 1. / self.source.fps
+        return properties
+
+    def stop(self):
+        self._stop.set()
+        # wakes up decoder waiting for free space
+        self._queue.clear()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.source.release()
+
+    @property
+    def stats(self) -> dict:
+        return self._queue.stats
+
+    def read(self) -> np.array:
+        now = time.perf_counter()
+        # don't hurry to catch up after long pause
+        if now - self._due > 1.:
+            self._due = now
+        # skips frames when called less often than fps of source
+        while now >= self._due:
+            try:
+                self._current = self._queue.get(block=False)
+            except queue.Empty:
+                # decoder is late, show current frame longer
+                break
+            self._due += 1. / self.source.fps
+        return self._current
+
+    def _worker(self):
+        while not self._stop.is_set():
+            try:
+                ret, frame = self.source.read(self._pool.next())
+            except Exception as e:
+                logger.warning("Prefetch of '%s' failed: %s", getattr(self.source, "path", self.source), e)
+                break
+            if not ret:
+                break
+            self._queue.put(frame)
+
+
+def is_image_file(path: Union[str, Path]) -> bool:
+    return Path(path).suffix.lower() in ImageSequenceSource.SUFFIXES
+
+
+def make_source(spec: Union[FrameSource, int, str, Path], width: Optional[int] = None,
+                height: Optional[int] = None, fps: Optional[float] = None) -> FrameSource:
+    """
+    Creates frame source from specification:
+      - FrameSource instance is used as is,
+      - int or digits: camera index,
+      - "synthetic": SyntheticSource,
+      - directory: ImageSequenceSource,
+      - existing file: VideoFileSource,
+      - anything else is passed to cv2.VideoCapture (device path, stream URL).
+    """
+    if isinstance(spec, FrameSource):
+        return spec
+    if isinstance(spec, int) or (isinstance(spec, str) and spec.strip().isdigit()):
+        return CameraSource(int(spec), width, height, fps)
+    if str(spec) == "synthetic":
+        return SyntheticSource(width, height, fps, realtime=True)
+    path = Path(spec)
+    if path.is_dir():
+        return ImageSequenceSource(path, width, height, fps)
+    if path.is_file() and not str(path).startswith("/dev/"):
+        return VideoFileSource(path, width, height, fps)
+    return CameraSource(str(spec), width, height, fps)
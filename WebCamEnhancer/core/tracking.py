@@ -0,0 +1,116 @@
+import numpy as np
+from typing import Callable, Optional
+
+
+def iou(a, b) -> float:
+    "Intersection over union of two (x, y, w, h) boxes."
+    x1, y1 = max(a[0], b[0]), max(a[1], b[1])
+    x2, y2 = min(a[0] + a[2], b[0] + b[2]), min(a[1] + a[3], b[1] + b[3])
+    inter = max(0., x2 - x1) * max(0., y2 - y1)
+    union = a[2] * a[3] + b[2] * b[3] - inter
+    return inter / union if union > 0 else 0.
+
+
+def expand_box(box, factor: float, shape: tuple) -> tuple:
+    "Box grown by `factor` of its size on every side and clipped to image of `shape`."
+    x, y, w, h = box
+    dx, dy = w * factor, h * factor
+    x1, y1 = max(0, int(x - dx)), max(0, int(y - dy))
+    x2, y2 = min(shape[1], int(x + w + dx)), min(shape[0], int(y + h + dy))
+    return (x1, y1, max(0, x2 - x1), max(0, y2 - y1))
+
+
+class Track:
+    "Smoothed box of one object."
+
+    def __init__(self, box):
+        self.box = np.asarray(box, np.float32)
+        self.misses = 0
+
+    def update(self, box, smoothing: float, reset_iou: float = 0.3):
+        box = np.asarray(box, np.float32)
+        # jump to new position instead of sliding over the frame
+        if iou(self.box, box) < reset_iou:
+            self.box = box
+        else:
+            self.box = smoothing * self.box + (1. - smoothing) * box
+        self.misses = 0
+
+
+class BoxTracker:
+    """
+    Detection with tracking between detections.
+
+    `detect(image, region)` returns (x, y, w, h) boxes in image coordinates, `region` is None
+    for whole image or (x, y, w, h) to search in. Whole image is searched every `interval` frames,
+    when nothing is tracked or when some track was lost. In between, each track is searched for
+    only in its box expanded by `expand`. Boxes are smoothed by exponential average
+    (`smoothing` is weight of the previous box). Lost track is reported for `misses_max` frames.
+    """
+
+    def __init__(self, detect: Callable, interval: int = 10, expand: float = 0.5,
+                 smoothing: float = 0.5, misses_max: int = 5):
+        self.detect = detect
+        self.interval = max(1, int(interval))
+        self.expand = expand
+        self.smoothing = smoothing
+        self.misses_max = misses_max
+        self.tracks = []
+        self.detections = 0
+        self._since_detection = 0
+        self._lost = False
+
+    def reset(self):
+        self.tracks = []
+        self._since_detection = 0
+        self._lost = False
+
+    def update(self, image: np.array) -> np.array:
+        "Boxes (int32 N x 4) of tracked objects in `image`."
+        self._since_detection += 1
+        if self._lost or not self.tracks or self._since_detection >= self.interval:
+            self._match(self.detect(image, None))
+            self.detections += 1
+            self._since_detection = 0
+            self._lost = False
+        else:
+            for track in self.tracks:
+                region = expand_box(track.box, self.expand, image.shape)
+                boxes = self.detect(image, region) if region[2] and region[3] else ()
+                best = self._best(track, boxes)
+                if best is None:
+                    track.misses += 1
+                    self._lost = True
+                else:
+                    track.update(best, self.smoothing)
+        self.tracks = [t for t in self.tracks if t.misses <= self.misses_max]
+        return self.boxes
+
+    @property
+    def boxes(self) -> np.array:
+        if not self.tracks:
+            return np.empty((0, 4), np.int32)
+        return np.rint(np.stack([t.box for t in self.tracks])).astype(np.int32)
+
+    @staticmethod
+    def _best(track: Track, boxes) -> Optional[np.array]:
+        "Detected box overlapping track the most, or the closest one."
+        if not len(boxes):
+            return None
+        center = track.box[:2] + track.box[2:] / 2
+        return max(boxes, key=lambda b: (iou(track.box, b), -np.hypot(*(np.asarray(b[:2]) + np.asarray(b[2:]) / 2 - center))))
+
+    def _match(self, boxes):
+        "Assigns detected boxes to tracks greedily by overlap. Unmatched boxes start new tracks."
+        unmatched = list(boxes)
+        for track in self.tracks:
+            if not unmatched:
+                track.misses += 1
+                continue
+            scores = [iou(track.box, b) for b in unmatched]
+            i = int(np.argmax(scores))
+            if scores[i] > 0:
+                track.update(unmatched.pop(i), self.smoothing)
+            else:
+                track.misses += 1
+        self.tracks.extend(Track(b) for b in unmatched)
@@ -1,8 +1,10 @@
-import cv2, sys, gettext
+import os, cv2, sys, gettext, functools
+from collections import OrderedDict
+from typing import Callable, Hashable
 import numpy as np
 import logging
 import logging.handlers
-from ..constants import APP_NAME, TRANSLATIONS_DIR
+from ..constants import APP_NAME, TRANSLATIONS_DIR, JIT_CACHE_DIR
 
 gettext.bindtextdomain(APP_NAME, TRANSLATIONS_DIR)
 gettext.textdomain(APP_NAME)
@@ -56,12 +58,45 @@ def configure_logging(log_file, level):
 logger = logging.getLogger(APP_NAME)
 
 
+def lazy_jit(**options):
+    """
+    numba.jit compiling on first call. Keeps numba out of import of the application
+    until some module using it is active. Compiled code is cached in JIT_CACHE_DIR
+    (unless NUMBA_CACHE_DIR is set), so it is compiled only once per machine.
+    """
+    options.setdefault("cache", True)
+
+    def decorator(function):
+        compiled = None
+
+        @functools.wraps(function)
+        def wrapper(*args):
+            nonlocal compiled
+            if compiled is None:
+                os.environ.setdefault("NUMBA_CACHE_DIR", str(JIT_CACHE_DIR))
+                import numba
+                # numba imported before reads the variable only at import
+                numba.config.CACHE_DIR = os.environ["NUMBA_CACHE_DIR"]
+                try:
+                    os.makedirs(numba.config.CACHE_DIR, exist_ok=True)
+                except OSError as e:
+                    logger.warning("JIT cache disabled: %s", e)
+                    options["cache"] = False
+                compiled = numba.jit(**options)(function)
+            return compiled(*args)
+        return wrapper
+    return decorator
+
+
 def resolve_xy_center(top_shape, bottom_shape, xy=None, center=None):
     x1, y1 = 0,0
     h1, w1 = top_shape
     h, w = bottom_shape
     if xy is not None:
         x, y = xy
+        # cut end of image
+        w = w1 = min(w1, w - x)
+        h = h1 = min(h1, h - y)
     elif center is not None:
         cx, cy = center
         x = int(cx - w1/2.)
@@ -100,15 +135,94 @@ def rotate_image(image: np.array, angle: float) -> np.array:
         flags=cv2.INTER_LINEAR
         )
 
+def blend(foreground: np.array, background: np.array, alpha: np.array, out: np.array = None) -> np.array:
+    """
+    Per-pixel mix foreground*alpha + background*(1-alpha) of all channels in one pass.
+    Images are uint8 (or float32) of same shape, alpha is float32 HxW in range 0..1.
+    `out` can be one of the inputs or their ROI.
+    """
+    alpha = np.asarray(alpha, np.float32)
+    return cv2.blendLinear(foreground, background, alpha, 1. - alpha, dst=out)
+
+
+class Sprite:
+    """
+    BGRA image premultiplied by its alpha, prepared for repeated compositing
+    by two saturated uint8 passes: dst*(255 - alpha)/255 + color*alpha/255.
+    """
+
+    def __init__(self, image: np.array):
+        if image.shape[2] == 3:
+            image = cv2.cvtColor(image, cv2.COLOR_BGR2BGRA)
+        alpha = cv2.cvtColor(image[:, :, 3], cv2.COLOR_GRAY2BGR)
+        self.color = cv2.multiply(cv2.cvtColor(image, cv2.COLOR_BGRA2BGR), alpha, scale=1/255.)
+        self.inverse_alpha = cv2.bitwise_not(alpha)
+        self.alpha = image[:, :, 3].copy()
+
+    @property
+    def shape(self) -> tuple:
+        return self.alpha.shape
+
+    @property
+    def nbytes(self) -> int:
+        return self.color.nbytes + self.inverse_alpha.nbytes + self.alpha.nbytes
+
+    def draw(self, bottom: np.array, xy=None, center=None) -> np.array:
+        "Composites sprite into BGR `bottom` in place. Cut by its borders."
+        ((x, y, w, h), (bx, by, bw, bh)) = resolve_xy_center(self.alpha.shape, bottom.shape[:2], xy, center)
+        if w <= 0 or h <= 0 or bw <= 0 or bh <= 0:
+            return bottom
+        region = bottom[y:y+h, x:x+w]
+        cv2.multiply(region, self.inverse_alpha[by:by+bh, bx:bx+bw], dst=region, scale=1/255.)
+        cv2.add(region, self.color[by:by+bh, bx:bx+bw], dst=region)
+        return bottom
+
+
+class SpriteCache:
+    "Least recently used sprites, limited by their total size in bytes."
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._sprites = OrderedDict()
+
+    def __len__(self):
+        return len(self._sprites)
+
+    def get(self, key: Hashable, render: Callable[[], Sprite]) -> Sprite:
+        "Cached sprite of `key`, rendered by `render()` when missing."
+        sprite = self._sprites.get(key)
+        if sprite is not None:
+            self._sprites.move_to_end(key)
+            self.hits += 1
+            return sprite
+        self.misses += 1
+        sprite = self._sprites[key] = render()
+        self.nbytes += sprite.nbytes
+        # newest one is kept even if it alone is over the limit
+        while self.nbytes > self.max_bytes and len(self._sprites) > 1:
+            self.nbytes -= self._sprites.popitem(last=False)[1].nbytes
+        return sprite
+
+    def clear(self):
+        self._sprites.clear()
+        self.nbytes = 0
+
+
 def draw_on_image(bottom: np.array, top: np.array, xy=None, center=None,transparency=0):
+    "Alpha blends BGRA `top` into BGR(A) `bottom` in place."
     ((x, y, w, h), (bx, by, bw, bh)) = resolve_xy_center(top.shape[:2],bottom.shape[:2], xy, center)
-    alpha_top = top[by:by+bh, bx:bx+bw, 3] / 255.0
-    alpha_bottom = 1.0 - alpha_top
-    for c in range(3):
-        # cv2.rectangle(bottom,(x,y), (x+w, y+h), (0,255,0),2)
-        bottom[y:y+h, x:x+w, c] = (
-            alpha_top * top[by:by+bh, bx:bx+bw, c] +
-            alpha_bottom * bottom[y:y+h, x:x+w, c]
-            )
-    if bottom.shape[2] == 4:
-        bottom[y:y+h, x:x+w, 3] = np.maximum(top[by:by+bh, bx:bx+bw, 3], bottom[y:y+h, x:x+w, 3])*(1.-transparency/255.)
\ No newline at end of file
+    if w <= 0 or h <= 0 or bw <= 0 or bh <= 0:
+        return
+    top = top[by:by+bh, bx:bx+bw]
+    region = bottom[y:y+h, x:x+w]
+    alpha = top[:, :, 3].astype(np.float32) * (1/255.)
+    color = cv2.cvtColor(top, cv2.COLOR_BGRA2BGR)
+    if bottom.shape[2] == 3:
+        blend(color, region, alpha, out=region)
+    else:
+        mixed = blend(color, cv2.cvtColor(region, cv2.COLOR_BGRA2BGR), alpha)
+        region[:, :, 3] = np.maximum(top[:, :, 3], region[:, :, 3])*(1.-transparency/255.)
+        region[:, :, :3] = mixed
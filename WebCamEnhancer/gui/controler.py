@@ -3,7 +3,8 @@ import tkinter.ttk as ttk
 
 from .preview import WebcamPreview
 from ..core.camera import CamerasWorker, CameraError
-from ..core.base import ModuleController
+from ..core.processes import ProcessWorker
+from ..core.registry import PLUGINS
 from ..config import Configuration
 from .settings import Setting
 from ..constants import ICON
@@ -200,13 +201,13 @@ class Controler:
 
     def load_filters(self):
         i = 0
-        for mod in sorted(ModuleController.MODULES["Filter"], key=lambda m: m.__name__):
-            iid = f"{mod.__name__}_{i}"
+        for mod in PLUGINS.descriptors("Filter"):
+            iid = f"{mod.name}_{i}"
             self.filters_view.insert('',
                 iid=iid,
                 index=i,
                 text=f"filter_{i}",
-                values=[mod.__name__, tt('None')]
+                values=[mod.name, tt('None')]
                 )
             i += 1
 
@@ -249,8 +250,10 @@ class Controler:
         else:
             try:
                 setting = Configuration.get_custom_config(Setting)
-                self._worker = CamerasWorker(
-                    in_cam = int(setting["input_cam"]),
+                # capture, inference and compositing in own processes
+                worker_class = ProcessWorker if Configuration.get_custom_config(ProcessWorker).get("enabled") else CamerasWorker
+                self._worker = worker_class(
+                    in_cam = setting["input_cam"],
                     out_cam = setting["output_cam"],
                     width = setting["width"] or None,
                     height = setting["height"] or None,
@@ -3,7 +3,7 @@ import tkinter.ttk as ttk
 
 from .utils import make_simple_setting_row
 from ..config import Configuration
-from ..core.base import ModuleController
+from ..core.registry import GROUPS, PLUGINS
 
 class ScrollableFrame(ttk.Frame):
     def __init__(self, container, *args, **kwargs):
@@ -64,8 +64,8 @@ class Setting:
         self.module_frame.columnconfigure(0, minsize=200)
         self.module_frame.pack(side="top", fill="x", padx=10, pady=5)
 
-        for group in ModuleController.MODULES.values():
-            for mod in sorted(group, key=lambda x: x.__name__):
+        for group in GROUPS:
+            for mod in PLUGINS.descriptors(group):
                 self._make_module(scroll_frame, mod)
 
         settings_frame.pack(expand="true", fill="both", side="top")
@@ -82,7 +82,7 @@ class Setting:
         self._settings[module] = {}
         config = Configuration.get_module_config(module)
         if config:
-            frame = ttk.Labelframe(master, text=f"{module.__mro__[1].__name__} - {module.__name__}", )
+            frame = ttk.Labelframe(master, text=f"{module.group} - {module.name}", )
             frame.columnconfigure(0, minsize=200)
             defaults = module.CONFIG_TEMPLATE
             for i,(k, default) in enumerate(defaults.items()):
@@ -1,52 +1,79 @@
+import cv2
+
 from ..core.base import Driver
+from ..core.utils import logger
 
 
 class Presence(Driver):
+    """
+    Switches between present and away filter by presence of person.
+
+    Presence is sampled every `sample_interval` seconds only (tick rate of the driver),
+    so middleware isn't computed for each frame because of it. It's share of Selfie mask (person when above `present_threshold`,
+    nobody when below `away_threshold`, unchanged in between) or any face found by Cascade.
+    Filter is switched after `away_frames` (`present_frames`) consecutive samples agree.
+    """
 
     CONFIG_TEMPLATE = {
         "present_filter": "Background",
-        "away_filter": "Away"
+        "away_filter": "Away",
+        # "Selfie" or "Cascade"
+        "detector": "Selfie",
+        "sample_interval": 0.5,
+        "away_threshold": 0.03,
+        "present_threshold": 0.08,
+        "away_frames": 10,
+        "present_frames": 2
     }
 
     def prepare(self):
-        self.names = {self.config["present_filter"], self.config["away_filter"]}
+        self.present_filter = self.config["present_filter"]
+        self.away_filter = self.config["away_filter"]
+        self.detector = self.config["detector"]
+        if self.detector not in ("Selfie", "Cascade"):
+            raise ValueError(f"Unknown presence detector '{self.detector}'. Use 'Selfie' or 'Cascade'.")
+        self.requires = (self.detector,)
+        self.tick_rate = 1. / max(self.config["sample_interval"], 0.01)
+        # consecutive samples disagreeing with current state
+        self.count = 0
+        self.away = None
 
-    def resolve(self):
-        active = self.names - set(self.worker._active_filters)
-        if not active:
-            return
-        active = active[0] 
-        # ...
-
-
-
-def resolve_away(changer, mask, state=[Config.PRESENT_FILTER, 0, True]):
-    # TODO: Optimize conditions. To mutch gunk.
-    if state[0] != changer._filter:
-        state[0] = changer._filter
-    if state[1] > Config.AWAY_FRAMES and state[0] == Config.PRESENT_FILTER:
-        state[0] = Config.AWAY_FILTER
-        state[1] = 0
-        changer._filter = state[0]
-    elif state[1] > Config.PRESET_FRAMES and state[0] == Config.AWAY_FILTER:
-        state[0] = Config.PRESENT_FILTER
-        state[1] = 0
-        changer._filter = state[0]
-    elif state[0] == Config.PRESENT_FILTER:
-        val = np.average(mask) < Config.AWAY_TRESHOLD
-        if val and state[2]:
-            state[1] += 1
-            state[2] = val
-        else:
-            state[1] = 0
-    elif state[0] == Config.AWAY_FILTER:
-        val = np.average(mask) > Config.AWAY_TRESHOLD
-        if val and state[2]:
-            state[1] += 1
-            state[2] = val
+    def sample(self, result):
+        "True if somebody is present, False if not, None if not sure."
+        if self.detector == "Cascade":
+            return bool(len(result))
+        share = cv2.mean(result)[0]
+        if share > self.config["present_threshold"]:
+            return True
+        if share < self.config["away_threshold"]:
+            return False
+        return None
+
+    def resolve(self, snapshot):
+        # filters may be changed by user since the snapshot
+        filters = tuple(self.worker.filters)
+        if self.present_filter in filters:
+            away = False
+        elif self.away_filter in filters:
+            away = True
         else:
-            state[1] = 0
-    # Prints warning
-    frames = Config.AWAY_FRAMES if state[0] == Config.PRESENT_FILTER else Config.PRESET_FRAMES
-    if state[1] and state[1] > (frames - changer.fps*Config.WARNING_SECS) and not (state[1]%changer.fps):
-        changer.logger.info(f"Changing {state[0]} in {int((frames - state[1])/changer.fps)}.")
\ No newline at end of file
+            # switching is off
+            return
+        if away != self.away:
+            # changed by user meanwhile
+            self.away, self.count = away, 0
+
+        result = snapshot.results.get(self.detector)
+        present = None if result is None else self.sample(result)
+        if present is None:
+            return
+        if present != away:
+            self.count = 0
+            return
+        self.count += 1
+        if self.count < (self.config["present_frames"] if away else self.config["away_frames"]):
+            return
+        self.count = 0
+        old, new = (self.away_filter, self.present_filter) if away else (self.present_filter, self.away_filter)
+        logger.info("Presence: %s, switching '%s' to '%s'.", "back" if away else "away", old, new)
+        self.worker.filters = tuple(new if name == old else name for name in filters)
@@ -1,16 +1,23 @@
 import cv2, time
 import numpy as np
-from numba import jit
+from collections import deque
 from ..core.base import Filter
-from ..core.utils import draw_on_image, rotate_image
+from ..core.utils import blend, draw_on_image, rotate_image, Sprite, SpriteCache
+from ..core.color import Affine, LUT1D, LUT3D
+from ..core.sources import PrefetchReader, VideoFileSource, is_image_file
 
 class Shake(Filter):
     "Shake two channels horizontally every frame."
 
+    IN_PLACE = True
+
     def prepare(self, resolution):
         self._frame_count = 0
 
-    def apply(self,frame):
+    def apply(self, frame, out=None):
+        if out is not None and out is not frame:
+            np.copyto(out, frame)
+            frame = out
         # Shake two channels horizontally each frame.
         channels = [[0, 1], [0, 2], [1, 2]]
 
@@ -24,34 +31,83 @@ class Shake(Filter):
         return frame
 
 class Info(Filter):
+    "FPS, latency, filters and resolution in the corner."
+
+    IN_PLACE = True
 
     CONFIG_TEMPLATE = {
         "color": "#FFF",
         "scale": 1.5,
-        "thickness": 2
+        "thickness": 2,
+        "update_interval": 0.5,
+        "window": 30
     }
 
     def prepare(self, resolution):
-        self.last_time = time.perf_counter()
         self.color = self.hex2color(self.config["color"])
         self.scale = self.config["scale"]
         self.thickness = self.config["thickness"]
+        self.update_interval = self.config["update_interval"]
+        self.font, self.dy = cv2.FONT_HERSHEY_PLAIN, int(30*self.scale)
+        (_, self.ascent), self.descent = cv2.getTextSize("Ay", self.font, self.scale, self.thickness)
+        # times of last frames and their latencies
+        self.times = deque(maxlen=max(2, self.config["window"]))
+        self.latencies = deque(maxlen=max(2, self.config["window"]))
+        self.next_update = 0.
+        self.stats = None
+        self.lines = None
+        self._lines_key = None
+
+    def render(self, lines: list) -> Sprite:
+        "Transparent sprite with text lines. Baseline of first one is `ascent` from the top."
+        width = max(cv2.getTextSize(line, self.font, self.scale, self.thickness)[0][0] for line in lines)
+        height = self.ascent + self.descent + self.thickness + (len(lines) - 1)*self.dy
+        image = np.zeros((height, width + self.thickness, 4), np.uint8)
+        color = self.color.tolist()[:3] + [255]
+        for i, line in enumerate(lines):
+            cv2.putText(image, line, (0, self.ascent + i*self.dy), self.font, self.scale, color, self.thickness)
+        return Sprite(image)
+
+    def apply(self, frame, out=None):
+        if out is None:
+            out = frame
+        elif out is not frame:
+            np.copyto(out, frame)
+        now = time.perf_counter()
+        self.times.append(now)
+        frame_time = getattr(self.worker, "frame_time", None)
+        if frame_time is not None:
+            self.latencies.append(now - frame_time)
 
-    def apply(self, frame):
-        text = [f"FPS: {int(1 / (time.perf_counter() - self.last_time))}"]
-        text.append(f"Filters: {', '.join(self.worker._active_filters)}")
         props = self.worker.input_cam_properties
-        text.append(f"Resolution: {props['width']}x{props['height']}")
-        self.last_time = time.perf_counter()
-
-        y0, dy = 50, int(30*self.scale)
-        for i, line in enumerate(text):
-            y = y0 + i*dy
-            cv2.putText(frame, line, (5, y), cv2.FONT_HERSHEY_PLAIN, self.scale, self.color.tolist(), self.thickness)
-        return frame
+        key = (self.worker._active_filters, props["width"], props["height"])
+        if key != self._lines_key:
+            self._lines_key = key
+            self.lines = self.render([
+                f"Filters: {', '.join(self.worker._active_filters)}",
+                f"Resolution: {props['width']}x{props['height']}"
+            ])
+
+        if now >= self.next_update and len(self.times) > 1:
+            self.next_update = now + self.update_interval
+            fps = (len(self.times) - 1) / (self.times[-1] - self.times[0])
+            text = f"FPS: {fps:.0f}"
+            if self.latencies:
+                text += f"  Latency: {1000*sum(self.latencies)/len(self.latencies):.0f} ms"
+            self.stats = self.render([text])
+
+        # first baseline at 50 px
+        if self.stats is not None:
+            self.stats.draw(out, xy=(5, 50 - self.ascent))
+        self.lines.draw(out, xy=(5, 50 + self.dy - self.ascent))
+        return out
 
 class ImageQuality(Filter):
-    "Apply some color/saturation corrections."
+    """Apply some color/saturation corrections.
+    Gamma, HSV scaling and RGB gains are baked into one lookup table in prepare().
+    """
+
+    IN_PLACE = True
 
     CONFIG_TEMPLATE = {
         "gamma": 1.68,
@@ -61,13 +117,24 @@ class ImageQuality(Filter):
 
         "red":1.25,
         "green": .95,
-        "blue": .85
+        "blue": .85,
+
+        "rebuild_on_change": True
     }
 
+    # Lattice spacing of 3D table. Must divide 255.
+    LUT_STEP = 5
+    SETTINGS = ("gamma", "hue", "saturation", "value", "red", "green", "blue")
+
     def make_setting(self, ):
         pass
 
     def prepare(self, resolution):
+        self.rebuild()
+
+    def rebuild(self):
+        "Bakes current config into lookup table."
+        self._settings = tuple(self.config[k] for k in self.SETTINGS)
         self.lookUpTable = np.empty((1,256), np.uint8)
         for i in range(256):
             self.lookUpTable[0,i] = np.clip(pow(i / 255.,  self.config["gamma"]) * 255., 0, 255)
@@ -75,52 +142,94 @@ class ImageQuality(Filter):
         self.hsv = np.array([self.config["hue"], self.config["saturation"], self.config["value"]])
         self.bgr = np.array([self.config["blue"], self.config["green"], self.config["red"]])
 
-    def apply(self, frame):
-            # gamma
-            frame = cv2.LUT(frame, self.lookUpTable)
-            if (self.hsv/1).any():
-                (h, s, v) = cv2.split(cv2.cvtColor(frame, cv2.COLOR_BGR2HSV).astype("float32"))
-                h = np.clip(h*self.hsv[0], 0, 255)
-                s = np.clip(s*self.hsv[1], 0, 255)
-                v = np.clip(v*self.hsv[2], 0, 255)
-
-                frame = cv2.cvtColor(cv2.merge([h,s,v]).astype("uint8"), cv2.COLOR_HSV2BGR)
-            if (self.bgr/1).any():
-                (b, g, r) = cv2.split(frame.astype("float32"))
-                b = np.clip(b*self.bgr[0], 0, 255)
-                g = np.clip(g*self.bgr[1], 0, 255)
-                r = np.clip(r*self.bgr[2], 0, 255)
-
-                frame = cv2.merge([b,g,r]).astype("uint8")
-            return frame
+        if (self.hsv == 1).all():
+            # gamma and gains are independent per channel
+            self.lut = LUT1D(np.clip(self.lookUpTable[0, :, None] * self.bgr, 0, 255))
+        else:
+            self.lut = LUT3D.bake(self.correct, self.LUT_STEP)
+
+    def correct(self, frame):
+        "Reference correction in separate passes. Used to bake lookup table."
+        # gamma
+        frame = cv2.LUT(frame, self.lookUpTable)
+        if (self.hsv != 1).any():
+            (h, s, v) = cv2.split(cv2.cvtColor(frame, cv2.COLOR_BGR2HSV).astype("float32"))
+            h = np.clip(h*self.hsv[0], 0, 255)
+            s = np.clip(s*self.hsv[1], 0, 255)
+            v = np.clip(v*self.hsv[2], 0, 255)
+
+            frame = cv2.cvtColor(cv2.merge([h,s,v]).astype("uint8"), cv2.COLOR_HSV2BGR)
+        if (self.bgr != 1).any():
+            (b, g, r) = cv2.split(frame.astype("float32"))
+            b = np.clip(b*self.bgr[0], 0, 255)
+            g = np.clip(g*self.bgr[1], 0, 255)
+            r = np.clip(r*self.bgr[2], 0, 255)
+
+            frame = cv2.merge([b,g,r]).astype("uint8")
+        return frame
+
+    def apply(self, frame, out=None):
+        return self.color_transform().apply(frame, out)
+
+    def warm_up(self, frame):
+        # compiles LUT3D kernel
+        self.color_transform().apply(frame)
+
+    def color_transform(self):
+        if self.config["rebuild_on_change"] and self._settings != tuple(self.config[k] for k in self.SETTINGS):
+            self.rebuild()
+        return self.lut
 
 class Pixel(Filter):
     """Blur foreground person.
     # Based on: # Docs: https://google.github.io/mediapipe/solutions/selfie_segmentation.html
     """
 
+    REQUIRES = ("Selfie",)
+
+    IN_PLACE = True
+
     CONFIG_TEMPLATE = {
         "size_x": 48,
         "size_y": 48
     }
 
-    def prepare(self,*_):
-        self.size = (self.config["size_x"], self.config["size_y"])
+    def prepare(self, resolution):
+        # pixel size is given by count of pixels over whole frame
+        self.block = (resolution[0]/self.config["size_x"], resolution[1]/self.config["size_y"])
+        self._pixelated = np.empty((resolution[1], resolution[0], 3), np.uint8)
 
-    def apply(self, frame):
-        foreground = np.stack((self.middleware["Selfie"].get(),) * 3, axis=-1) > 0.1
+    def apply(self, frame, out=None):
+        foreground = self.crop(self.middleware["Selfie"].get()) > 0.1
 
         height, width, n_channels = frame.shape
-        temp = cv2.resize(frame, tuple(self.size), interpolation=cv2.INTER_LINEAR)
+        size = (max(1, round(width/self.block[0])), max(1, round(height/self.block[1])))
+        temp = cv2.resize(frame, size, interpolation=cv2.INTER_LINEAR)
+        pixelated = cv2.resize(temp, (width, height), dst=self._pixelated[:height, :width], interpolation=cv2.INTER_NEAREST)
 
-        return np.where(foreground, cv2.resize(temp, (width, height), interpolation=cv2.INTER_NEAREST), frame)
+        if out is None:
+            out = frame
+        elif out is not frame:
+            np.copyto(out, frame)
+        return cv2.copyTo(pixelated, foreground.view(np.uint8), out)
 
 
 class Gray(Filter):
     "Grayscale image."
 
-    def apply(self, frame):
-        return np.repeat(cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY), 3).reshape(frame.shape)
+    IN_PLACE = True
+    TRANSFORM = Affine(np.full((3, 3), [0.114, 0.587, 0.299]))
+
+    def prepare(self, resolution):
+        self._gray = np.empty((resolution[1], resolution[0]), np.uint8)
+
+    def apply(self, frame, out=None):
+        # shared with middleware when Gray is the first filter
+        gray = self.view("gray", frame, self._gray)
+        return cv2.cvtColor(gray, cv2.COLOR_GRAY2BGR, dst=out)
+
+    def color_transform(self):
+        return self.TRANSFORM
 
 
 class Sepia(Filter):
@@ -128,31 +237,33 @@ class Sepia(Filter):
     # Based on: https://gist.github.com/FilipeChagasDev/bb63f46278ecb4ffe5429a84926ff812
     """
 
-    def apply(self, frame):
-        grayscale_norm = np.array(cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY), np.float32)/255
+    IN_PLACE = True
 
-        # Solid color
-        sepia = np.ones(frame.shape)
-        sepia[:, :, 0] *= 153  # Blue channel
-        sepia[:, :, 1] *= 204  # Green channel
-        sepia[:, :, 2] *= 255  # Red channel
+    # Luma weights (BGR) of grayscale scaled to solid sepia color, per output channel.
+    KERNEL = np.outer(np.array([153, 204, 255], np.float32) / 255., [0.114, 0.587, 0.299]).astype(np.float32)
+    TRANSFORM = Affine(KERNEL)
 
-        # Hadamard
-        sepia[:, :, 0] *= grayscale_norm  # Blue channel
-        sepia[:, :, 1] *= grayscale_norm  # Green channel
-        sepia[:, :, 2] *= grayscale_norm  # Red channel
+    def apply(self, frame, out=None):
+        # Grayscale and Hadamard with solid color in one pass
+        return cv2.transform(frame, self.KERNEL, dst=out)
 
-        return np.array(sepia, np.uint8)
+    def color_transform(self):
+        return self.TRANSFORM
 
 class LaughingMan(Filter):
     "Laughing man overlay."
 
+    REQUIRES = ("Cascade",)
+
     CONFIG_TEMPLATE = {
         "face_image_path": "img/lman_face.png",
         "plate_image_path": "img/lman_plate.png",
         "lifetime": -1,
         "scale": 1.6,
-        "rotation_rate": -2.
+        "rotation_rate": -2.,
+        "angle_step": 4.,
+        "size_step": 8,
+        "cache_megabytes": 64
     }
 
     def prepare(self, resolution):
@@ -166,8 +277,18 @@ class LaughingMan(Filter):
         self.lifetime = self.config["lifetime"]
         self.scale = self.config["scale"]
         self.rotation_rate = self.config["rotation_rate"]
+        # sprites of plate rotated by multiples of angle_step with face, by height in multiples of size_step
+        self.angle_step = max(self.config["angle_step"], 0.1)
+        self.size_step = max(int(self.config["size_step"]), 1)
+        self.sprites = SpriteCache(int(self.config["cache_megabytes"] * 2**20))
+
+    def render(self, angle: float, height: int) -> Sprite:
+        combo = rotate_image(self.text_img, angle)
+        draw_on_image(combo, self.face_img, xy=(0,0))
+        ratio = height/self.face_img.shape[0]
+        size = (max(1, int(self.face_img.shape[1]*ratio)), height)
+        return Sprite(cv2.resize(combo, size, interpolation=cv2.INTER_AREA))
 
-    
     def apply(self, frame):
         faces = self.middleware["Cascade"].get()
         if self.lifetime != -1 and self.previous_lifetime > self.lifetime:
@@ -180,57 +301,76 @@ class LaughingMan(Filter):
             faces = self.previous_coords
             self.previous_lifetime +=1
 
+        angle = (round(self.rotation / self.angle_step) * self.angle_step) % 360
+        # faces are in full frame coordinates
+        x0, y0 = self.region[:2] if self.region is not None else (0, 0)
         for (x, y, w, h) in faces:
             # Scale image to be larger then detected face
-            ws, hs = int(w * self.scale), int(h * self.scale)
-            ratio = ws/self.face_img.shape[0]
-            size = (int(self.face_img.shape[1]*ratio), int(self.face_img.shape[0]*ratio))
-            xc, yc = int(x + w/2), int(y + h/2.42)
+            height = max(1, round(w * self.scale / self.size_step)) * self.size_step
+            xc, yc = int(x + w/2) - x0, int(y + h/2.42) - y0
 
-            combo = np.zeros(self.face_img.shape)
-            draw_on_image(combo, rotate_image(self.text_img, self.rotation), xy=(0, 0))
-            draw_on_image(combo, self.face_img, xy=(0,0))
-            draw_on_image(frame, cv2.resize(combo, size), center=(xc, yc))
+            sprite = self.sprites.get((angle, height), lambda: self.render(angle, height))
+            sprite.draw(frame, center=(xc, yc))
 
             # Debug rectangle
             # cv2.rectangle(frame, (x,y), (x+w, y+h), (0,255,0),2)
             
             self.previous_coords = faces
 
-        self.rotation += self.rotation_rate
+        self.rotation = (self.rotation + self.rotation_rate) % 360
 
         return frame
 
 
+def open_background(path: str, resolution: tuple):
+    """
+    Background of `resolution` from still image or video file.
+    Returns (first frame, PrefetchReader or None for image).
+    """
+    if is_image_file(path):
+        return cv2.resize(cv2.imread(path, cv2.IMREAD_COLOR), resolution), None
+    reader = PrefetchReader(VideoFileSource(path, *resolution))
+    reader.start()
+    return reader.read(), reader
+
+
 class Background(Filter):
-    "Repleaces background with a picture."
+    "Repleaces background with a picture or looped video."
+
+    REQUIRES = ("Selfie",)
+
+    IN_PLACE = True
 
     CONFIG_TEMPLATE = {
         "background_image_path": "img/background.png"
     }
 
     def prepare(self, resolution):
-        self.bg = cv2.resize(cv2.imread(self.get_existing_file("background_image_path"), cv2.IMREAD_UNCHANGED), resolution)
+        self.bg, self.video = open_background(self.get_existing_file("background_image_path"), resolution)
         self.mask = None
 
-    
-    def apply(self, frame):
+    def release(self):
+        if self.video is not None:
+            self.video.stop()
+
+    def apply(self, frame, out=None):
+        if out is None:
+            out = frame
+        if self.video is not None:
+            self.bg = self.video.read()
         # simple 2-sample running average filter
         mask = self.middleware["Selfie"].get()
         if self.mask is None:
-            self.mask = mask
+            self.mask = np.asarray(mask, np.float32)
         else:
-            self.mask = (self.mask/2 + mask)/1.5
-                          
-        # blend images with segmentation mask (fg*mask + bg*(1-mask))
-        for i in range(3):
-            frame[:,:,i] = frame[:,:,i]*self.mask + self.bg[:,:,i]*(1.-self.mask)
+            self.mask = cv2.addWeighted(self.mask, 1/3., mask, 2/3., 0., dtype=cv2.CV_32F)
 
-        return frame
+        # blend images with segmentation mask (fg*mask + bg*(1-mask))
+        return blend(frame, self.crop(self.bg), self.crop(self.mask), out=out)
 
 
 class Away(Filter):
-    "Away sign with background picture."
+    "Away sign with background picture or looped video."
 
     CONFIG_TEMPLATE = {
         "away_image_path": "img/away.png",
@@ -238,23 +378,31 @@ class Away(Filter):
     }
 
     def prepare(self, resolution):
-        self.away = cv2.imread(self.get_existing_file("away_image_path"), cv2.IMREAD_UNCHANGED)
-        self.bg = cv2.imread(self.get_existing_file("background_path"), cv2.IMREAD_UNCHANGED)
+        self.away = Sprite(cv2.imread(self.get_existing_file("away_image_path"), cv2.IMREAD_UNCHANGED))
+        path = self.get_existing_file("background_path")
+        self.image, self.video = open_background(path, resolution)
+        # sign is drawn over copy of background
+        self.bg = self.image.copy()
         self.done = False
-    
+
+    def release(self):
+        if self.video is not None:
+            self.video.stop()
+
+    def static_output(self):
+        return self.video is None
+
     def apply(self, frame):
-        if not self.done:
-            yoff = round((frame.shape[0]-self.away.shape[0])/2)
-            xoff = round((frame.shape[1]-self.away.shape[1])/2)
-            mask = self.away[:,:,3] / 255.0
-            try:
-                self.bg = cv2.resize(self.bg, (frame.shape[1], frame.shape[0]))
-                for i in range(3):
-                    self.bg[yoff:yoff+self.away.shape[0], xoff:xoff+self.away.shape[1],i] = \
-                        mask*self.away[:,:,i] + (
-                            1 - mask)*self.bg[yoff:yoff+self.away.shape[0], xoff:xoff+self.away.shape[1],i]
-            except ValueError:
-                raise ValueError("AwayFilter: Can't add away to background. probably away is bigger. fix that.")
+        if self.away.shape[0] > frame.shape[0] or self.away.shape[1] > frame.shape[1]:
+            raise ValueError("AwayFilter: Can't add away to background. probably away is bigger. fix that.")
+        if self.video is not None:
+            np.copyto(self.bg, self.video.read())
+            self.away.draw(self.bg, center=(frame.shape[1]/2, frame.shape[0]/2))
+        elif not self.done or self.bg.shape != frame.shape:
+            # still image is composited only once
+            self.bg = cv2.resize(self.image, (frame.shape[1], frame.shape[0]))
+            self.away.draw(self.bg, center=(frame.shape[1]/2, frame.shape[0]/2))
+            self.done = True
         return self.bg
 
 
@@ -263,14 +411,19 @@ class ASCII(Filter):
     # Based on: https://www.learnpythonwithrune.org/ascii-art-of-live-webcam-stream-with-opencv/
     """
 
+    REQUIRES = ("Selfie",)
+
+    IN_PLACE = True
+
     CONFIG_TEMPLATE = {
         "character_color": "#FFFF00",
         "canny_threshold_1": 35,
         "canny_threshold_2": 14,
         "canny_aperture_size": 3,
         "canny_l2_enabled": False,
-        "gaussian_kernel": 5
-
+        "gaussian_kernel": 5,
+        # mask value of person, only its bounding box is converted
+        "foreground_threshold": 0.05
     }
 
     def prepare(self, resolution):
@@ -279,9 +432,12 @@ class ASCII(Filter):
         self.color = self.hex2color(self.config["character_color"])
         #RGB to BGR
         self.color = np.array([*reversed(self.color)])
+        # gray to BGR of character color in one pass
+        self.colorize = np.asarray(self.color, np.float32).reshape(3, 1)/255.
         self.coeficient = 1
         self.box = (6*self.coeficient, 8*self.coeficient)
         self.images = self.generate_ascii_letters(*self.box)
+        self.features, self.costs = self.glyph_features(self.images)
         self.canny_kwargs = {
             "threshold1": self.config["canny_threshold_1"],
             "threshold2": self.config["canny_threshold_2"],
@@ -289,23 +445,44 @@ class ASCII(Filter):
             "L2gradient": bool(self.config["canny_l2_enabled"])
             }
         self.gaussian_kernel = (self.config["gaussian_kernel"], self.config["gaussian_kernel"])
+        # blur and canny reach this far, background beyond is plain and has no edges
+        self.margin = self.config["gaussian_kernel"]//2 + int(self.config["canny_aperture_size"])//2 + 2
+        self.threshold = self.config["foreground_threshold"]
+
+        # cell without edges everywhere out of person
+        width, height = resolution
+        blank = self.to_ascii_art(np.zeros(self.box, np.uint8), self.images, *self.box, self.features, self.costs)
+        rows, cols = -(-height//self.box[0]), -(-width//self.box[1])
+        self.blank = cv2.transform(np.tile(blank, (rows, cols))[:height, :width, None], self.colorize)
 
     @staticmethod
-    @jit(nopython=True)
-    def to_ascii_art(frame, images, box_height=12, box_width=16):
+    def glyph_features(images):
+        """
+        Glyph pixels and costs for matching by matrix product. Distance of binary edge cell x
+        and glyph g is sum of uint8 differences (x - g) wrapping over 255, which is
+        255*|x| + costs[g] - 256 * x.features[g].
+        """
+        flat = images.reshape(len(images), -1).astype(np.float32)
+        features = (flat > 0).astype(np.float32)
+        costs = ((256. - flat) * features).sum(axis=1)
+        return features, costs
+
+    @staticmethod
+    def to_ascii_art(frame, images, box_height=12, box_width=16, features=None, costs=None):
+        "Replaces each cell of binary edge image by the closest glyph. All cells matched at once."
+        if features is None:
+            features, costs = ASCII.glyph_features(images)
         height, width = frame.shape
-        for i in range(0, height, box_height):
-            for j in range(0, width, box_width):
-                roi = frame[i:i + box_height, j:j + box_width]
-                best_match = np.inf
-                best_match_index = 0
-                for k in range(1, images.shape[0]):
-                    total_sum = np.sum(np.absolute(np.subtract(roi, images[k])))
-                    if total_sum < best_match:
-                        best_match = total_sum
-                        best_match_index = k
-                roi[:,:] = images[best_match_index]
-        return frame
+        rows, cols = -(-height//box_height), -(-width//box_width)
+        if (rows*box_height, cols*box_width) != (height, width):
+            frame = cv2.copyMakeBorder(frame, 0, rows*box_height - height, 0, cols*box_width - width, cv2.BORDER_CONSTANT)
+        cells = frame.reshape(rows, box_height, cols, box_width).swapaxes(1, 2).reshape(rows*cols, -1)
+        overlap = (cells > 0).astype(np.float32) @ features.T
+        # first glyph (space) is never used
+        scores = costs[1:] - 256. * overlap[:, 1:]
+        index = scores.argmin(axis=1) + 1
+        art = images[index].reshape(rows, cols, box_height, box_width).swapaxes(1, 2)
+        return art.reshape(rows*box_height, cols*box_width)[:height, :width]
 
     @staticmethod
     def generate_ascii_letters(height, width,):
@@ -317,20 +494,39 @@ class ASCII(Filter):
             img = cv2.putText(img, letter, (0, 5), cv2.FONT_HERSHEY_SIMPLEX, int(height/6), 255)
             images.append(img)
         return np.stack(images)
+
+    def foreground_box(self, mask) -> tuple:
+        "Bounding box of person grown by margin and aligned to cells."
+        x, y, w, h = cv2.boundingRect((mask > self.threshold).view(np.uint8))
+        if not w or not h:
+            return (0, 0, 0, 0)
+        bh, bw = self.box
+        x1, y1 = max(0, (x - self.margin)//bw*bw), max(0, (y - self.margin)//bh*bh)
+        x2 = min(mask.shape[1], -(-(x + w + self.margin)//bw)*bw)
+        y2 = min(mask.shape[0], -(-(y + h + self.margin)//bh)*bh)
+        return (x1, y1, x2 - x1, y2 - y1)
     
-    def apply(self, frame):
-        mask = self.middleware["Selfie"].get()
-        # blend images with segmentation mask (fg*mask + bg*(1-mask))
-        for i in range(3):
-            frame[:,:,i] = frame[:,:,i]*mask + self.bg[:,:,i]*(1.-mask)
-
-        ascii = self.to_ascii_art(
-            cv2.Canny(
-                cv2.GaussianBlur(frame, self.gaussian_kernel, 4),
-                **self.canny_kwargs),
-            self.images,
-            *self.box
-        )
-        # set foreground color
-        colorized = np.asarray(cv2.cvtColor(ascii,cv2.COLOR_GRAY2BGR)*(np.asarray(self.color, np.float32)/255.),np.uint8)
-        return colorized
\ No newline at end of file
+    def apply(self, frame, out=None):
+        mask = self.crop(self.middleware["Selfie"].get())
+        x, y, w, h = self.foreground_box(mask)
+        if out is None:
+            out = np.empty_like(frame)
+        # blended into `out`, it's overwritten by blank below; frame stays untouched
+        region = out[y:y+h, x:x+w]
+        if w and h:
+            # blend images with segmentation mask (fg*mask + bg*(1-mask))
+            blend(frame[y:y+h, x:x+w], self.crop(self.bg)[y:y+h, x:x+w], mask[y:y+h, x:x+w], out=region)
+            ascii = self.to_ascii_art(
+                cv2.Canny(
+                    cv2.GaussianBlur(region, self.gaussian_kernel, 4),
+                    **self.canny_kwargs),
+                self.images,
+                *self.box,
+                self.features,
+                self.costs
+            )
+        np.copyto(out, self.crop(self.blank))
+        if w and h:
+            # set foreground color
+            cv2.transform(ascii[:, :, None], self.colorize, dst=out[y:y+h, x:x+w])
+        return out
@@ -1,11 +1,20 @@
 import cv2
-import mediapipe as mp
+import numpy as np
+from functools import lru_cache
 
 from ..core.base import Middleware
+from ..core.tracking import BoxTracker
 
 
-CASCADE_FACE = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
-SELFIE_SEGMENTATION = mp.solutions.selfie_segmentation.SelfieSegmentation(model_selection=1)
+# Models are loaded on first use, so they cost nothing until middleware is needed by a filter.
+@lru_cache(maxsize=None)
+def cascade_face():
+    return cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
+
+@lru_cache(maxsize=None)
+def selfie_segmentation(model_selection=1):
+    import mediapipe as mp
+    return mp.solutions.selfie_segmentation.SelfieSegmentation(model_selection=model_selection)
 
 class Cascade(Middleware):
 
@@ -13,23 +22,99 @@ class Cascade(Middleware):
         "scale_factor": 1.1,
         "min_neighbors": 7,
         "min_size_x": 100,
-        "min_size_y": 100
+        "min_size_y": 100,
+        # detect on image downscaled by this factor
+        "detection_scale": 0.5,
+        # follow faces in expanded area around last box between detections on whole frame
+        "tracking_enabled": True,
+        "detection_interval": 10,
+        "roi_expand": 0.5,
+        # weight of previous box in smoothing, 0 for none
+        "smoothing": 0.5,
+        # frames to keep lost face
+        "lost_frames_max": 5
     }
 
-    def apply(self, frame):
-        return CASCADE_FACE.detectMultiScale(
-            cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY),
+    def prepare(self, resolution):
+        self._scale = min(1., float(self.config["detection_scale"]))
+        self._tracker = BoxTracker(
+            self.detect,
+            self.config["detection_interval"],
+            self.config["roi_expand"],
+            self.config["smoothing"],
+            self.config["lost_frames_max"]
+        )
+
+    def detect(self, gray, region=None):
+        "Faces in gray image or its region (x, y, w, h) as int32 N x 4 boxes in image coordinates."
+        x, y = 0, 0
+        if region is not None:
+            x, y, w, h = region
+            gray = gray[y:y+h, x:x+w]
+        if self._scale < 1.:
+            gray = cv2.resize(gray, None, fx=self._scale, fy=self._scale, interpolation=cv2.INTER_AREA)
+        faces = cascade_face().detectMultiScale(
+            gray,
             scaleFactor=self.config['scale_factor'],
             minNeighbors=self.config['min_neighbors'],
-            minSize=(self.config['min_size_x'], self.config['min_size_y']),
+            minSize=(int(self.config['min_size_x']*self._scale), int(self.config['min_size_y']*self._scale)),
             flags=cv2.CASCADE_SCALE_IMAGE
         )
+        if not len(faces):
+            return np.empty((0, 4), np.int32)
+        return (np.asarray(faces) / self._scale).astype(np.int32) + np.array([x, y, 0, 0], np.int32)
+
+    def warm_up(self, frame):
+        cascade_face()
+
+    def apply(self, frame):
+        gray = self.views["gray"]
+        if not self.config["tracking_enabled"]:
+            return self.detect(gray)
+        return self._tracker.update(gray)
 
 class Selfie(Middleware):
 
+    CONFIG_TEMPLATE = {
+        # width of image for segmentation (aspect ratio kept), 0 for full resolution
+        "inference_width": 256,
+        # segment every n-th frame, reuse previous mask in between
+        "inference_interval": 1
+    }
+
+    def prepare(self, resolution):
+        width, height = resolution
+        inference_width = int(self.config["inference_width"])
+        if 0 < inference_width < width:
+            self._size = (inference_width, max(1, round(height * inference_width / width)))
+        else:
+            self._size = None
+        self._interval = max(1, int(self.config["inference_interval"]))
+        self._calls = 0
+        self._mask = None
+        self._rgb = None
+
+    def warm_up(self, frame):
+        selfie_segmentation()
+
     def apply(self, frame):
+        self._calls += 1
+        reuse = self._mask is not None and self._mask.shape == frame.shape[:2]
+        if reuse and (self._calls - 1) % self._interval:
+            return self._mask
+
+        small = frame if self._size is None else cv2.resize(frame, self._size, interpolation=cv2.INTER_AREA)
+        # mediapipe expects RGB
+        if self._rgb is None or self._rgb.shape != small.shape:
+            self._rgb = np.empty_like(small)
+        rgb = cv2.cvtColor(small, cv2.COLOR_BGR2RGB, dst=self._rgb)
         # To improve performance, optionally mark the image as not writeable
-        frame.flags.writeable = False
-        mask = SELFIE_SEGMENTATION.process(frame).segmentation_mask
-        frame.flags.writeable = True
-        return mask
\ No newline at end of file
+        rgb.flags.writeable = False
+        mask = selfie_segmentation().process(rgb).segmentation_mask
+        rgb.flags.writeable = True
+
+        # upsampled once and shared by all filters. New array, so readers of old mask are not affected.
+        if mask.shape != frame.shape[:2]:
+            mask = cv2.resize(mask, (frame.shape[1], frame.shape[0]), interpolation=cv2.INTER_LINEAR)
+        self._mask = mask
+        return mask
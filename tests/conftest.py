@@ -0,0 +1,11 @@
+from WebCamEnhancer.config import Configuration
+import pytest
+
+
+@pytest.fixture
+def configuration():
+    "Default configuration, restored after the test."
+    data = Configuration.data
+    Configuration.data = Configuration.generate_default()
+    yield Configuration
+    Configuration.data = data
@@ -0,0 +1,31 @@
+from WebCamEnhancer.core.base import FrameViews, Middleware
+import numpy as np
+
+
+def test_frame_views_computed_once_per_frame():
+    calls = []
+    views = FrameViews()
+    views.CONVERSIONS = {"sum": lambda frame, dst=None: calls.append(1) or frame.sum(axis=-1)}
+    frame = np.ones((2, 2, 3), np.uint8)
+    alias = frame.copy()
+    views.set_frame(frame, 1, alias=alias)
+    assert (views["sum"] == 3).all()
+    assert views.get("sum", alias) is views["sum"]
+    assert len(calls) == 1
+    # other arrays are converted without caching
+    assert (views.get("sum", frame * 2) == 6).all()
+    assert len(calls) == 2
+
+    views.set_frame(frame * 3, 2)
+    assert (views["sum"] == 9).all()
+    assert len(calls) == 3
+
+
+def test_middleware_peek_never_computes():
+    mdl = Middleware({})
+    mdl.apply = lambda frame: frame.sum()
+    mdl.set_frame(np.ones((2, 2), np.uint8), 7)
+    assert mdl.peek() is None
+    assert mdl.get() == 4 and mdl.peek() == (4, 7)
+    mdl.set_frame(np.ones((2, 2), np.uint8), 8)
+    assert mdl.peek() is None
@@ -0,0 +1,58 @@
+from WebCamEnhancer.core.buffers import FrameQueue, FramePool
+import numpy as np
+import queue
+import pytest
+
+
+def test_frame_queue_drop_oldest():
+    q = FrameQueue(2, "drop_oldest")
+    for i in range(5):
+        assert q.put(i)
+    assert [q.get(), q.get()] == [3, 4]
+    assert q.stats["dropped"] == 3
+    assert q.stats["high_water"] == 2
+
+
+def test_frame_queue_drop_newest():
+    q = FrameQueue(2, "drop_newest")
+    assert [q.put(i) for i in range(4)] == [True, True, False, False]
+    assert [q.get(), q.get()] == [0, 1]
+    assert q.dropped == 2
+
+
+def test_frame_queue_block_timeout():
+    q = FrameQueue(1, "block")
+    assert q.put(0)
+    assert not q.put(1, timeout=0.01)
+    assert q.dropped == 1
+    assert q.get() == 0
+    with pytest.raises(queue.Empty):
+        q.get(timeout=0.01)
+    with pytest.raises(ValueError):
+        FrameQueue(1, "unknown")
+
+
+def test_frame_queue_releases_dropped_items():
+    released = []
+    q = FrameQueue(2, "drop_oldest", on_drop=released.append)
+    for i in range(4):
+        q.put(i)
+    q.clear()
+    assert released == [0, 1, 2, 3]
+    q = FrameQueue(1, "drop_newest", on_drop=released.append)
+    assert q.put(None) and not q.put(None)
+    assert released[-1] is None and len(q) == 1
+
+
+def test_frame_pool_reuses_released_buffers_only():
+    pool = FramePool((2, 2, 3), 2)
+    a, b = pool.acquire(), pool.acquire()
+    # all in use, new one is allocated instead of reusing
+    c = pool.acquire()
+    assert len({id(a), id(b), id(c)}) == 3 and len(pool) == 3 and pool.in_use == 3
+    pool.release(b)
+    pool.release(b)
+    pool.release(np.empty((2, 2, 3), np.uint8))
+    assert pool.in_use == 2
+    assert pool.acquire() is b
+    assert pool.acquire() is not b and len(pool) == 4
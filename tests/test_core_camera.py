@@ -0,0 +1,321 @@
+from WebCamEnhancer.core.camera import CamerasWorker
+from WebCamEnhancer.core.sources import SyntheticSource
+from WebCamEnhancer.core.sinks import NullSink, TeeSink, FileSink, make_sink
+import numpy as np
+import json
+
+
+def test_make_sink(tmp_path):
+    sink = make_sink(f"null,{tmp_path / 'out.raw'}", 4, 2)
+    assert isinstance(sink, TeeSink)
+    assert [type(s) for s in sink.sinks] == [NullSink, FileSink]
+    sink.open()
+    for i in range(3):
+        sink.send(np.full((2, 4, 3), i, np.uint8))
+    sink.close()
+    assert sink.sinks[0].stats["frames"] == 3
+    assert (tmp_path / "out.raw").read_bytes() == bytes([0]*24 + [1]*24 + [2]*24)
+
+
+def test_worker_without_devices(configuration):
+    sink = NullSink(160, 120)
+    worker = CamerasWorker(SyntheticSource(160, 120, realtime=True, fps=200), sink)
+    worker.start()
+    try:
+        frames = [worker.get_frame(timeout=1.) for _ in range(5)]
+    finally:
+        worker.stop()
+    assert all(f is not None and f.shape == (120, 160, 3) for f in frames)
+    assert sink.frames >= 5
+
+
+def test_worker_trace_export(configuration, tmp_path):
+    config = configuration.get_custom_config(CamerasWorker)
+    config["trace_enabled"] = True
+    config["trace_path"] = tmp_path / "trace.json"
+    worker = CamerasWorker(SyntheticSource(160, 120, realtime=True, fps=200), NullSink(160, 120))
+    worker.start()
+    try:
+        for _ in range(3):
+            worker.get_frame(timeout=1.)
+    finally:
+        worker.stop()
+    events = json.loads((tmp_path / "trace.json").read_text())["traceEvents"]
+    spans = {e["name"] for e in events if e["ph"] == "X"}
+    assert {"frame", "set_frame", "send", "preview", "read"} <= spans
+
+
+def test_pointwise_filters_are_fused(configuration):
+    from WebCamEnhancer.modules.filters import Gray, Sepia, Shake
+    worker = CamerasWorker(SyntheticSource(64, 48), NullSink(64, 48))
+    worker._filters = {k.__name__: k({}, {}, worker) for k in (Gray, Sepia, Shake)}
+    for flt in worker._filters.values():
+        flt.prepare((64, 48))
+    plan = worker._make_plan(("Gray", "Sepia", "Shake", "Gray"))
+    assert [name for name, _ in plan] == ["Gray+Sepia", "Shake", "Gray"]
+
+    source = SyntheticSource(64, 48)
+    source.open()
+    frame = source.render(0)
+    expected = worker._filters["Sepia"].apply(worker._filters["Gray"].apply(frame.copy()))
+    fused = plan[0][1].apply(frame.copy())
+    assert np.abs(fused.astype(int) - expected).max() <= 2
+
+
+def test_filters_loaded_when_activated(configuration):
+    worker = CamerasWorker(SyntheticSource(160, 120, realtime=True, fps=200), NullSink(160, 120))
+    worker.filters = ("Gray",)
+    worker.start()
+    try:
+        worker.get_frame(timeout=1.)
+        assert set(worker._filters) == {"Gray"} and not worker._middleware
+        worker.filters = ("Gray", "LaughingMan", "Missing")
+        assert worker.filters == ("Gray", "LaughingMan")
+        assert set(worker._middleware) == {"Cascade"}
+        assert worker.get_frame(timeout=1.) is not None
+    finally:
+        worker.stop()
+
+
+def test_filter_warms_up_in_background(configuration):
+    worker = CamerasWorker(SyntheticSource(160, 120, realtime=True, fps=200), NullSink(160, 120))
+    worker.filters = ("ImageQuality",)
+    worker.start()
+    try:
+        # frames flow (unfiltered) while kernel compiles
+        assert worker.get_frame(timeout=1.) is not None
+        flt = worker._filters["ImageQuality"]
+        assert flt._ready.wait(60)
+        assert worker.get_frame(timeout=1.) is not None
+    finally:
+        worker.stop()
+
+
+def test_static_output_throttles_capture(configuration):
+    import time
+    source = SyntheticSource(640, 480, realtime=True, fps=200)
+    sink = NullSink(640, 480, fps=50)
+    worker = CamerasWorker(source, sink)
+    worker.filters = ("Away",)
+    worker.start()
+    try:
+        first = worker.get_frame(timeout=1.)
+        captured, sent = source.index, sink.frames
+        start = time.perf_counter()
+        # wait for some output instead of fixed time, slow machine only takes longer
+        while sink.frames - sent < 20 and time.perf_counter() < start + 10.:
+            time.sleep(0.05)
+        elapsed = time.perf_counter() - start
+        captured, sent = source.index - captured, sink.frames - sent
+        last = worker.get_frame(timeout=1.)
+        # live again without static filter
+        worker.filters = ()
+        live = source.index
+        while source.index - live < 20 and time.perf_counter() < start + 20.:
+            time.sleep(0.05)
+        live = source.index - live
+    finally:
+        worker.stop()
+    assert first is last
+    # output at most at 50 fps, camera at most at 2 fps instead of 200
+    assert 20 <= sent <= elapsed * 50 + 2
+    assert captured <= elapsed * 2 + 2
+    assert live >= 20
+
+
+def test_region_filter_applies_inside_box():
+    from types import SimpleNamespace
+    from WebCamEnhancer.core.base import FrameViews
+    from WebCamEnhancer.core.camera import RegionFilter
+    from WebCamEnhancer.modules.filters import Gray, Pixel
+
+    class Mask:
+        def get(self):
+            mask = np.zeros((48, 64), np.float32)
+            mask[10:20, 30:40] = 1.
+            return mask
+
+    middleware = {"Selfie": Mask()}
+    frame = np.random.default_rng(0).integers(0, 256, (48, 64, 3), np.uint8)
+    gray = Gray({}, middleware, SimpleNamespace(views=FrameViews()))
+    gray.prepare((64, 48))
+    out = RegionFilter(gray, [8, 4, 16, 12], middleware).apply(frame.copy())
+    expected = frame.copy()
+    expected[4:16, 8:24] = gray.apply(frame[4:16, 8:24].copy())
+    assert np.array_equal(out, expected) and gray.region is None
+
+    pixel = Pixel({"size_x": 8, "size_y": 8}, middleware, None)
+    pixel.prepare((64, 48))
+    region = RegionFilter(pixel, "foreground", middleware, margin=2)
+    assert region.boxes(frame.shape) == [(28, 8, 14, 14)]
+    out = region.apply(frame.copy())
+    changed = (out != frame).any(axis=-1)
+    # only the person got pixelated
+    assert changed[10:20, 30:40].any() and not changed.sum() - changed[10:20, 30:40].sum()
+
+
+class Probe:
+    "IN_PLACE filter recording whether its input changed while it was applied."
+
+    IN_PLACE = True
+    ready = True
+
+    def __init__(self, delay=0., value=None):
+        self.delay = delay
+        self.value = value
+        self.changed = 0
+        self.calls = 0
+
+    def static_output(self):
+        return False
+
+    def color_transform(self):
+        return None
+
+    def apply(self, frame, out=None):
+        import time
+        before = frame.copy()
+        time.sleep(self.delay)
+        self.calls += 1
+        self.changed += not np.array_equal(before, frame)
+        if out is None:
+            out = frame
+        np.copyto(out, frame)
+        if self.value is not None:
+            out[0, 0] = self.value
+        return out
+
+
+def test_apply_plan_respects_ownership(configuration):
+    from WebCamEnhancer.core.buffers import FramePool
+    worker = CamerasWorker(SyntheticSource(8, 4), NullSink(8, 4))
+    pool = FramePool((4, 8, 3), 1)
+    worker._plan = ((), [("a", Probe(value=1)), ("b", Probe(value=2))])
+    frame = np.zeros((4, 8, 3), np.uint8)
+    out = worker._apply_plan(frame, pool, owned=False)
+    # input untouched, one scratch buffer holds the output
+    assert not frame.any() and out is not frame and pool.owns(out)
+    assert out[0, 0, 0] == 2 and pool.in_use == 1
+    pool.release(out)
+    assert worker._apply_plan(frame, pool) is frame and frame[0, 0, 0] == 2
+    assert pool.in_use == 0
+
+
+class Cached(Probe):
+    "Returns its own array like Away with still background."
+
+    IN_PLACE = False
+
+    def __init__(self):
+        super().__init__()
+        self.bg = np.full((4, 8, 3), 9, np.uint8)
+
+    def apply(self, frame):
+        return self.bg
+
+
+class Draw(Probe):
+    "Draws into its input like LaughingMan."
+
+    IN_PLACE = False
+
+    def apply(self, frame):
+        frame[0, 0] = 1
+        return frame
+
+
+def test_apply_plan_never_returns_or_draws_into_filter_arrays(configuration):
+    from WebCamEnhancer.core.buffers import FramePool
+    worker = CamerasWorker(SyntheticSource(8, 4), NullSink(8, 4))
+    pool = FramePool((4, 8, 3), 1)
+    cached = Cached()
+    frame = np.zeros((4, 8, 3), np.uint8)
+    for plan, value in (([("away", cached)], 9), ([("away", cached), ("draw", Draw())], 1)):
+        worker._plan = ((), plan)
+        out = worker._apply_plan(frame, pool)
+        assert out is not cached.bg and pool.owns(out) and out[0, 0, 0] == value
+        assert (cached.bg == 9).all() and not frame.any()
+        pool.release(out)
+    # input which isn't ours is copied before drawing
+    worker._plan = ((), [("draw", Draw())])
+    out = worker._apply_plan(frame, pool, owned=False)
+    assert not frame.any() and pool.owns(out) and out[0, 0, 0] == 1
+
+
+def test_frames_not_overwritten_while_used(configuration):
+    import time
+    config = configuration.get_custom_config(CamerasWorker)
+    config["frame_delay_max"] = 1.
+    probe = Probe(delay=0.05)
+    worker = CamerasWorker(SyntheticSource(160, 120, realtime=True, fps=200), NullSink(160, 120))
+    worker.start()
+    worker._filters["Probe"] = probe
+    worker._active_filters = ("Probe",)
+    try:
+        previews = []
+        deadline = time.perf_counter() + 10.
+        while probe.calls < 5 and time.perf_counter() < deadline:
+            frame = worker.get_frame(timeout=1.)
+            if frame is not None:
+                # frame given to GUI is kept until next get_frame()
+                held = frame.copy()
+                time.sleep(0.03)
+                previews.append(np.array_equal(held, frame))
+    finally:
+        worker.stop()
+    assert probe.calls >= 5 and probe.changed == 0 and all(previews)
+
+
+def test_pipelined_presence_returns_from_static_away(configuration):
+    import time
+    from WebCamEnhancer.core.base import Middleware, ModuleController
+    config = configuration.get_custom_config(CamerasWorker)
+    config["middleware_pipelined"] = True
+    config["active_drivers"] = ["Presence"]
+    config["static_capture_fps"] = 20.
+    configuration["Driver"]["Presence"].update(
+        present_filter="Gray", sample_interval=0.05, away_frames=1, present_frames=1)
+
+    person = {"present": False, "samples": 0}
+    # pipeline knows middleware by class name
+    class Selfie(Middleware):
+        def apply(self, frame):
+            person["samples"] += 1
+            return np.full(frame.shape[:2], float(person["present"]), np.float32)
+    ModuleController.MODULES["Middleware"].remove(Selfie)
+
+    worker = CamerasWorker(SyntheticSource(640, 480, realtime=True, fps=100), NullSink(640, 480))
+    worker._create_middleware = lambda name: Selfie({})
+    worker.filters = ("Away",)
+    worker.start()
+    try:
+        deadline = time.perf_counter() + 2.
+        while (worker._static is None or not person["samples"]) and time.perf_counter() < deadline:
+            time.sleep(0.05)
+        assert worker._static is not None and worker.filters == ("Away",)
+        # somebody comes back while output is static and capture throttled
+        person["present"] = True
+        deadline = time.perf_counter() + 5.
+        while worker.filters != ("Gray",) and time.perf_counter() < deadline:
+            time.sleep(0.05)
+    finally:
+        worker.stop()
+    assert worker.filters == ("Gray",)
+
+
+def test_blocking_preview_without_reader_doesnt_hang_stop(configuration):
+    import threading, time
+    config = configuration.get_custom_config(CamerasWorker)
+    config["preview_queue_policy"] = "block"
+    config["frame_delay_max"] = 0.05
+    sink = NullSink(160, 120)
+    worker = CamerasWorker(SyntheticSource(160, 120, realtime=True, fps=200), sink)
+    worker.start()
+    # nobody calls get_frame(), preview queue gets full
+    deadline = time.perf_counter() + 10.
+    while sink.frames < 10 and time.perf_counter() < deadline:
+        time.sleep(0.01)
+    stopper = threading.Thread(target=worker.stop, daemon=True)
+    stopper.start()
+    stopper.join(10.)
+    assert not stopper.is_alive() and sink.frames >= 10
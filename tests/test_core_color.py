@@ -0,0 +1,35 @@
+from WebCamEnhancer.core.color import Affine, LUT1D, LUT3D, compose
+import numpy as np
+
+
+def test_lut3d_reproduces_baked_function():
+    frame = np.random.default_rng(0).integers(0, 256, (30, 40, 3), dtype=np.uint8)
+    identity = LUT3D.bake(lambda f: f, step=15)
+    assert np.abs(identity.apply(frame).astype(int) - frame).max() <= 1
+
+    swap = LUT3D.bake(lambda f: np.ascontiguousarray(f[..., ::-1]), step=5)
+    out = np.empty_like(frame)
+    assert swap.apply(frame, out) is out
+    assert np.abs(out.astype(int) - frame[..., ::-1]).max() <= 1
+
+
+def test_lut1d_per_channel():
+    frame = np.full((2, 2, 3), 100, np.uint8)
+    table = np.stack((np.arange(256), 255 - np.arange(256), np.zeros(256)), axis=1)
+    assert LUT1D(table).apply(frame)[0, 0].tolist() == [100, 155, 0]
+
+
+def test_compose_matches_sequential():
+    frame = np.random.default_rng(1).integers(0, 256, (30, 40, 3), dtype=np.uint8)
+    gray = Affine(np.full((3, 3), [0.114, 0.587, 0.299]))
+    tint = Affine(np.diag([0.6, 0.8, 1.]), [10, 0, 0])
+    gamma = LUT1D(np.clip((np.arange(256) / 255.) ** 1.5 * 255, 0, 255))
+    invert = LUT1D(255 - np.arange(256))
+
+    for transforms, kind in (((gray, tint), Affine), ((gamma, invert), LUT1D), ((gamma, gray, tint), LUT3D)):
+        fused = compose(transforms)
+        assert isinstance(fused, kind)
+        expected = frame
+        for t in transforms:
+            expected = t.apply(expected)
+        assert np.abs(fused.apply(frame).astype(int) - expected).max() <= 2
@@ -0,0 +1,34 @@
+from WebCamEnhancer.core.base import Middleware
+from WebCamEnhancer.core.pipeline import MiddlewarePipeline
+import numpy as np
+
+
+def test_pipeline_returns_lagged_results():
+    mdl = Middleware({})
+    mdl.apply = lambda frame: int(frame[0, 0, 0])
+    pipeline = MiddlewarePipeline({"Middleware": mdl}, (2, 2, 3))
+    pipeline.start()
+    try:
+        results = []
+        for index in range(1, 6):
+            frame = np.full((2, 2, 3), index, np.uint8)
+            mdl.set_frame(frame, index)
+            results.append((mdl.get(), mdl.result_index))
+            pipeline.submit(frame, index)
+            # wait for the pipeline thread to finish this frame
+            with pipeline._cond:
+                assert pipeline._cond.wait_for(lambda: pipeline.computed == index, 5.)
+    finally:
+        pipeline.stop()
+    # first request is computed synchronously, then results lag one frame
+    assert results[0] == (1, 1)
+    assert all(value == index for value, index in results)
+    assert [index for _, index in results[1:]] == [1, 2, 3, 4]
+    assert mdl.pipeline is None
+
+
+def test_pipeline_results_never_go_backwards():
+    pipeline = MiddlewarePipeline({}, (2, 2, 3))
+    pipeline._publish("Middleware", ("new", 5))
+    pipeline._publish("Middleware", ("old", 4))
+    assert pipeline._results["Middleware"] == ("new", 5)
@@ -0,0 +1,89 @@
+from WebCamEnhancer.core.buffers import FramePool
+from WebCamEnhancer.core.processes import SharedFrames, ProcessWorker, RemoteMiddleware, CompositingWorker, Channels
+import numpy as np
+import pickle, queue, threading
+
+
+def test_shared_frames_attach_same_memory():
+    frames = SharedFrames((4, 6, 3), 2, ("Selfie",))
+    try:
+        other = pickle.loads(pickle.dumps(frames))
+        assert not other.owner and other.name == frames.name
+        frames.frames[0][:] = 0
+        frames.frames[1][:] = 7
+        frames.masks[1]["Selfie"][:] = 0.5
+        assert (other.frames[0] == 0).all() and (other.frames[1] == 7).all()
+        assert (other.masks[1]["Selfie"] == 0.5).all()
+        other.close()
+    finally:
+        frames.close()
+        frames.unlink()
+
+
+def test_remote_middleware_computes_only_missing_result():
+    loaded = []
+    class Local:
+        def compute(self, frame, views=None):
+            return frame.sum()
+    def load(name):
+        loaded.append(name)
+        return Local()
+
+    mdl = RemoteMiddleware("Sum", load)
+    frame = np.ones((2, 2), np.uint8)
+    mdl.set_frame(frame, 1)
+    mdl.set_result(42, 1)
+    assert mdl.get() == 42 and not loaded
+    mdl.set_frame(frame, 2)
+    assert mdl.get() == 4 and mdl.result_index == 2 and loaded == ["Sum"]
+
+
+def test_plane_results_outlive_slot(configuration):
+    frames = SharedFrames((4, 6, 3), 1, ("Selfie",))
+    try:
+        worker = CompositingWorker(frames, frames, None, "null", {"width": 6, "height": 4, "fps": 30}, False, False)
+        worker._plan = ((), [])
+        selfie = worker._middleware["Selfie"]
+        frames.masks[0]["Selfie"][:] = 0.5
+        worker._process(0, 1, 0., {}, ("Selfie",), FramePool(frames.shape, 1))
+        mask = selfie.get()
+        # inference writes next frame into the slot
+        frames.masks[0]["Selfie"][:] = 1.
+        assert (mask == 0.5).all() and selfie.result_index == 1
+        del mask, selfie, worker
+    finally:
+        frames.close()
+        frames.unlink()
+
+
+def test_driver_middleware_not_required_from_inference(configuration):
+    class Context:
+        Event = threading.Event
+        Queue = queue.Queue
+    class Driver:
+        requires = ("Selfie",)
+
+    channels = Channels(Context)
+    worker = CompositingWorker(None, None, channels, "null", {"width": 6, "height": 4, "fps": 30}, False, False)
+    worker._drivers = {"Presence": Driver()}
+    worker._active_filters = ("Gray",)
+    worker._require()
+    # drivers compute it here at their tick rate
+    assert channels.require.get_nowait() == ()
+    worker._active_filters = ("Gray", "LaughingMan")
+    worker._require()
+    assert channels.require.get_nowait() == ("Cascade",)
+
+
+def test_process_worker_synthetic(configuration):
+    worker = ProcessWorker("synthetic", "null", 160, 120, 30)
+    worker.filters = ("Gray",)
+    worker.start()
+    try:
+        frames = [worker.get_frame(timeout=2.) for _ in range(5)]
+    finally:
+        worker.stop()
+    assert all(f is not None and f.shape == (120, 160, 3) for f in frames)
+    # gray in all channels
+    assert all((f[..., 0] == f[..., 1]).all() for f in frames)
+    assert worker.output_cam_properties["width"] == 160
@@ -0,0 +1,20 @@
+from WebCamEnhancer.core.profiling import ImportTimer
+import sys
+
+
+def test_import_timer_records_nested_imports(tmp_path, monkeypatch):
+    (tmp_path / "timed_outer.py").write_text("import timed_inner\n")
+    (tmp_path / "timed_inner.py").write_text("import time\ntime.sleep(0.02)\n")
+    monkeypatch.syspath_prepend(str(tmp_path))
+    timer = ImportTimer().install()
+    try:
+        import timed_outer
+    finally:
+        timer.uninstall()
+        sys.modules.pop("timed_outer", None)
+        sys.modules.pop("timed_inner", None)
+    records = {name: (own, cumulative, depth) for name, own, cumulative, depth in timer.records}
+    assert records["timed_inner"][2] == 1 and records["timed_outer"][2] == 0
+    assert records["timed_outer"][1] >= records["timed_inner"][1] >= 0.02
+    assert records["timed_outer"][0] < 0.02
+    assert "timed_outer" in timer.report()
@@ -0,0 +1,56 @@
+from WebCamEnhancer.core.base import ModuleController
+from WebCamEnhancer.core.registry import Registry
+import subprocess, sys, textwrap
+
+
+def test_builtin_plugins_described_without_import():
+    code = textwrap.dedent("""
+        import sys
+        from WebCamEnhancer.config import Configuration
+        from WebCamEnhancer.core.registry import PLUGINS
+        defaults = Configuration.generate_default()
+        assert "Selfie" in defaults["Middleware"] and "ImageQuality" in defaults["Filter"]
+        assert PLUGINS.get("Filter", "Background").requires == ("Selfie",)
+        heavy = [m for m in sys.modules if m.split(".")[0] in ("numba", "mediapipe", "matplotlib")]
+        plugins = [m for m in sys.modules if m.startswith("WebCamEnhancer.modules.")]
+        assert not heavy and not plugins, heavy + plugins
+    """)
+    subprocess.run([sys.executable, "-c", code], check=True)
+
+
+def test_entry_point_plugin(tmp_path, monkeypatch):
+    (tmp_path / "my_filters.py").write_text(textwrap.dedent("""
+        from WebCamEnhancer.core.base import Filter
+
+        class Negative(Filter):
+            "Inverts colors."
+            REQUIRES = ("Selfie",)
+            CONFIG_TEMPLATE = {"strength": 1.0}
+    """))
+    dist = tmp_path / "my_filters-1.0.dist-info"
+    dist.mkdir()
+    (dist / "METADATA").write_text("Metadata-Version: 2.1\nName: my-filters\nVersion: 1.0\n")
+    (dist / "entry_points.txt").write_text("[webcamenhancer.filters]\nNegative = my_filters:Negative\n")
+    monkeypatch.syspath_prepend(str(tmp_path))
+
+    registry = Registry(builtin=())
+    descriptor = registry.get("Filter", "Negative")
+    assert descriptor.CONFIG_TEMPLATE == {"strength": 1.0}
+    assert descriptor.requires == ("Selfie",) and not descriptor.loaded
+    assert "my_filters" not in sys.modules
+    klass = registry.load("Filter", "Negative")
+    sys.modules.pop("my_filters", None)
+    ModuleController.MODULES["Filter"].remove(klass)
+    assert klass.__doc__ == "Inverts colors."
+
+
+def test_broken_entry_point_is_skipped(tmp_path, monkeypatch):
+    dist = tmp_path / "broken_filters-1.0.dist-info"
+    dist.mkdir()
+    (dist / "METADATA").write_text("Metadata-Version: 2.1\nName: broken-filters\nVersion: 1.0\n")
+    (dist / "entry_points.txt").write_text("[webcamenhancer.filters]\nBroken = missing_module_xyz:Broken\n")
+    monkeypatch.syspath_prepend(str(tmp_path))
+
+    registry = Registry(builtin=("WebCamEnhancer.modules.filters",))
+    names = [d.name for d in registry.descriptors("Filter")]
+    assert "Broken" not in names and "Gray" in names
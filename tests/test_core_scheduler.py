@@ -0,0 +1,74 @@
+from WebCamEnhancer.core.profiling import Tracer
+from WebCamEnhancer.core.scheduler import DriverScheduler
+import threading
+import time
+
+
+class Counter:
+    def __init__(self):
+        self.calls = 0
+
+    def get(self):
+        self.calls += 1
+        return self.calls
+
+    def peek(self):
+        return None
+
+
+class Driver:
+    requires = ("Selfie",)
+    tick_rate = 20.
+
+    def __init__(self):
+        self.snapshots = []
+        self.threads = set()
+
+    def resolve(self, snapshot):
+        self.snapshots.append(snapshot)
+        self.threads.add(threading.current_thread().name)
+
+
+class Worker:
+    frame_index = 0
+    filters = ("Gray",)
+    queue_stats = {}
+
+
+def test_drivers_tick_on_own_thread():
+    middleware = {"Selfie": Counter(), "Cascade": Counter()}
+    driver = Driver()
+    scheduler = DriverScheduler(Worker(), {"Test": driver})
+    frames = 0
+    start = time.perf_counter()
+    scheduler.start()
+    # runs until enough ticks, slow machine only takes longer
+    end = start + 10.
+    while len(driver.snapshots) < 5 and time.perf_counter() < end:
+        Worker.frame_index = frames = frames + 1
+        scheduler.collect(middleware, time.perf_counter())
+        time.sleep(0.002)
+    scheduler.stop()
+    elapsed = time.perf_counter() - start
+    # never more often than tick rate, required middleware computed only for ticks, not for each frame
+    assert 5 <= len(driver.snapshots) <= elapsed * Driver.tick_rate + 1
+    assert middleware["Selfie"].calls == len(driver.snapshots) and middleware["Cascade"].calls == 0
+    indexes = [s.index for s in driver.snapshots]
+    assert indexes == sorted(set(indexes)) and frames > len(driver.snapshots)
+    assert driver.threads == {"drivers"}
+    assert driver.snapshots[-1].results == {"Selfie": middleware["Selfie"].calls}
+
+
+def test_driver_resolve_is_traced():
+    tracer = Tracer()
+    driver = Driver()
+    scheduler = DriverScheduler(Worker(), {"Test": driver}, tracer)
+    scheduler.start()
+    try:
+        end = time.perf_counter() + 10.
+        while not driver.snapshots and time.perf_counter() < end:
+            scheduler.collect({"Selfie": Counter()}, time.perf_counter())
+            time.sleep(0.01)
+    finally:
+        scheduler.stop()
+    assert any(name == "Test" and cat == "driver" for name, cat, *_ in tracer.events)
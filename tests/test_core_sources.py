@@ -0,0 +1,54 @@
+from WebCamEnhancer.core import sources
+import numpy as np
+import cv2
+import time
+
+
+def test_synthetic_source_is_deterministic():
+    a, b = sources.SyntheticSource(320, 240), sources.SyntheticSource(320, 240)
+    assert a.open() == {"width": 320, "height": 240, "fps": 30.}
+    b.open()
+    for _ in range(3):
+        (ret_a, frame_a), (ret_b, frame_b) = a.read(), b.read()
+        assert ret_a and ret_b
+        assert frame_a.shape == (240, 320, 3)
+        assert np.array_equal(frame_a, frame_b)
+    assert not np.array_equal(a.render(0), a.render(30))
+
+
+def test_image_sequence_source(tmp_path):
+    for i in range(2):
+        cv2.imwrite(str(tmp_path / f"{i}.png"), np.full((20, 30, 4), i*100, np.uint8))
+    source = sources.make_source(str(tmp_path), 15, 10)
+    assert isinstance(source, sources.ImageSequenceSource)
+    source.open()
+    frames = [source.read()[1] for _ in range(3)]
+    assert frames[0].shape == (10, 15, 3)
+    assert [f[0, 0, 0] for f in frames] == [0, 100, 0]
+
+
+def test_make_source_dispatch():
+    assert isinstance(sources.make_source("0"), sources.CameraSource)
+    assert isinstance(sources.make_source("synthetic"), sources.SyntheticSource)
+    assert isinstance(sources.make_source("/dev/video0"), sources.CameraSource)
+
+
+def test_prefetch_reader_loops_video(tmp_path):
+    path = str(tmp_path / "background.avi")
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"MJPG"), 25, (32, 24))
+    for value in (0, 100, 200):
+        writer.write(np.full((24, 32, 3), value, np.uint8))
+    writer.release()
+
+    reader = sources.PrefetchReader(sources.VideoFileSource(path, 16, 12, fps=100.), size=2)
+    reader.start()
+    seen = []
+    for _ in range(40):
+        frame = reader.read()
+        assert frame.shape == (12, 16, 3)
+        seen.append(int(round(frame.mean() / 100.)) * 100)
+        time.sleep(0.01)
+    reader.stop()
+    assert seen[0] == 0 and set(seen) == {0, 100, 200}
+    # played over the end again from the start
+    assert any(a == 200 and b == 0 for a, b in zip(seen, seen[1:]))
@@ -0,0 +1,41 @@
+from WebCamEnhancer.core.tracking import BoxTracker, expand_box, iou
+import numpy as np
+
+
+def test_expand_box_is_clipped():
+    assert expand_box((10, 10, 20, 20), 0.5, (40, 35)) == (0, 0, 35, 40)
+    assert iou((0, 0, 10, 10), (5, 0, 10, 10)) == 50 / 150
+
+
+def test_tracker_detects_every_interval_and_smooths():
+    calls = []
+    positions = iter([(100 + (i % 2) * 4, 50, 40, 40) for i in range(100)])
+    def detect(image, region):
+        calls.append(region)
+        box = next(positions)
+        if region is not None:
+            x, y, w, h = region
+            assert x <= box[0] and box[0] + box[2] <= x + w
+        return np.array([box], np.int32)
+
+    tracker = BoxTracker(detect, interval=5, smoothing=0.5)
+    image = np.zeros((240, 320), np.uint8)
+    boxes = [tracker.update(image) for _ in range(10)]
+    assert [c is None for c in calls] == [True, False, False, False, False] * 2
+    # alternating 100/104 detections are smoothed
+    assert all(101 <= b[0, 0] <= 103 for b in boxes[1:])
+
+
+def test_tracker_redetects_when_lost():
+    hits = iter([True, True, False, True, False, False, False])
+    calls = []
+    def detect(image, region):
+        calls.append(region)
+        return np.array([[10, 10, 20, 20]], np.int32) if next(hits) else np.empty((0, 4), np.int32)
+
+    tracker = BoxTracker(detect, interval=100, misses_max=1)
+    image = np.zeros((100, 100), np.uint8)
+    results = [len(tracker.update(image)) for _ in range(6)]
+    # lost on third frame, whole frame searched on next one
+    assert [c is None for c in calls[:4]] == [True, False, False, True]
+    assert results == [1, 1, 1, 1, 1, 0]
@@ -12,3 +12,40 @@ def test_resolve_xy_center():
     assert ((35,34,5,6), (0,0,5,6))==utils.resolve_xy_center((10,6),(40,40), center=(38,39))
     # mixup in coordinates
     assert ((36,33,4,9), (0,0,4,9))==utils.resolve_xy_center((10,6),(42,40), center=(39,38))
+
+
+def test_blend_in_place_roi():
+    fg = np.full((4, 6, 3), 200, np.uint8)
+    bg = np.full((4, 6, 3), 100, np.uint8)
+    alpha = np.full((2, 3), 0.25, np.float32)
+    roi = bg[1:3, 2:5]
+    assert utils.blend(fg[1:3, 2:5], roi, alpha, out=roi) is roi
+    assert (bg[1:3, 2:5] == 125).all()
+    assert (bg[0] == 100).all() and (bg[:, :2] == 100).all()
+
+
+def test_sprite_matches_draw_on_image():
+    rng = np.random.default_rng(0)
+    top = rng.integers(0, 256, (10, 8, 4), dtype=np.uint8)
+    bottom = rng.integers(0, 256, (20, 20, 3), dtype=np.uint8)
+    expected = bottom.copy()
+    utils.draw_on_image(expected, top, center=(3, 15))
+    utils.Sprite(top).draw(bottom, center=(3, 15))
+    assert np.abs(expected.astype(int) - bottom).max() <= 2
+
+
+def test_sprite_cache_evicts_least_recently_used():
+    renders = []
+
+    def render(value):
+        renders.append(value)
+        return utils.Sprite(np.full((10, 10, 4), value, np.uint8))
+
+    cache = utils.SpriteCache(max_bytes=2 * render(0).nbytes)
+    renders.clear()
+    for key in (1, 2, 1, 3, 1, 2):
+        cache.get(key, lambda: render(key))
+    # 2 was evicted by 3, then 3 by 2 again
+    assert renders == [1, 2, 3, 2]
+    assert len(cache) == 2 and cache.nbytes <= cache.max_bytes
+    assert (cache.hits, cache.misses) == (2, 4)
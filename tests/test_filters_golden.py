@@ -0,0 +1,36 @@
+from WebCamEnhancer.core import benchmark
+from pathlib import Path
+import cv2
+import numpy as np
+import pytest
+
+GOLDEN_DIR = Path(__file__).parent / "golden"
+
+
+@pytest.mark.parametrize("klass", benchmark.golden_filters(), ids=lambda k: k.__name__)
+def test_filter_matches_golden(klass):
+    expected = cv2.imread(str(GOLDEN_DIR / f"{klass.__name__}.png"), cv2.IMREAD_UNCHANGED)
+    assert expected is not None, "Missing golden image. Run: python -m WebCamEnhancer.core.benchmark --update-golden tests/golden"
+    difference = benchmark.golden_difference(expected, benchmark.render_golden(klass))
+    assert difference["ok"], difference
+
+
+def test_benchmark_reports_filter():
+    klass = next(k for k in benchmark.golden_filters() if k.__name__ == "Gray")
+    result = benchmark.bench_filter(klass, (64, 48), frames=3, warmup=1)
+    assert result["fps"] > 0 and result["p99_ms"] >= result["p50_ms"] >= 0
+
+
+@pytest.mark.parametrize("klass", [k for k in benchmark.golden_filters() if k.IN_PLACE], ids=lambda k: k.__name__)
+def test_in_place_filter_keeps_input(klass):
+    # same frames applied in place and into separate `out`
+    inplace, separate = benchmark.Harness((160, 120)), benchmark.Harness((160, 120))
+    flt_inplace, flt_separate = inplace.make_filter(klass), separate.make_filter(klass)
+    for i in range(3):
+        expected = inplace.apply(flt_inplace, inplace.set_frame(i))
+        frame = separate.set_frame(i)
+        before = frame.copy()
+        out = np.empty_like(frame)
+        result = flt_separate.apply(frame, out=out)
+        assert result is out and np.array_equal(frame, before)
+        assert benchmark.golden_difference(expected, result)["ok"]
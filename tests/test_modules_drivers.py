@@ -0,0 +1,35 @@
+from WebCamEnhancer.core.scheduler import Snapshot
+from WebCamEnhancer.modules.drivers import Presence
+import numpy as np
+
+
+class Worker:
+    def __init__(self, filters):
+        self.filters = filters
+
+
+def snapshot(share):
+    mask = np.zeros((10, 10), np.float32)
+    mask.flat[:int(share * 100)] = 1.
+    return Snapshot(0, 0., 0., (), {"Selfie": mask}, {})
+
+
+def test_presence_switches_with_hysteresis():
+    worker = Worker(("Gray", "Background"))
+    driver = Presence(dict(Presence.CONFIG_TEMPLATE, sample_interval=0.25, away_frames=3, present_frames=2), {}, worker)
+    driver.prepare()
+    assert driver.requires == ("Selfie",) and driver.tick_rate == 4.
+
+    for _ in range(2):
+        driver.resolve(snapshot(0.))
+    assert worker.filters == ("Gray", "Background")
+    driver.resolve(snapshot(0.))
+    assert worker.filters == ("Gray", "Away")
+
+    # between thresholds nothing changes
+    for _ in range(5):
+        driver.resolve(snapshot(0.05))
+    assert worker.filters == ("Gray", "Away")
+    for _ in range(2):
+        driver.resolve(snapshot(0.5))
+    assert worker.filters == ("Gray", "Background")
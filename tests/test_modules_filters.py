@@ -0,0 +1,34 @@
+from WebCamEnhancer.modules.filters import ASCII
+import numpy as np
+
+
+def test_ascii_matches_wrapping_difference():
+    images = ASCII.generate_ascii_letters(6, 8)
+    edges = (np.random.default_rng(0).random((15, 21)) < 0.3).astype(np.uint8) * 255
+    art = ASCII.to_ascii_art(edges, images, 6, 8)
+    assert art.shape == edges.shape
+    for i in range(0, 15, 6):
+        for j in range(0, 21, 8):
+            cell = edges[i:i+6, j:j+8]
+            h, w = cell.shape
+            # original per-cell scan (uint8 differences wrap), partial cells padded by zeros
+            padded = np.zeros((6, 8), np.uint8)
+            padded[:h, :w] = cell
+            scores = [np.subtract(padded, g).sum(dtype=np.int64) if k else np.inf for k, g in enumerate(images)]
+            assert (art[i:i+6, j:j+8] == images[int(np.argmin(scores))][:h, :w]).all()
+
+
+def test_info_rerenders_only_on_change():
+    from WebCamEnhancer.core import benchmark
+    from WebCamEnhancer.modules.filters import Info
+    harness = benchmark.Harness((320, 240), frames=2)
+    info = harness.make_filter(Info)
+    for i in range(2):
+        harness.apply(info, harness.set_frame(i))
+    lines, stats = info.lines, info.stats
+    harness.apply(info, harness.set_frame(1))
+    # FPS is updated every update_interval
+    assert info.lines is lines and info.stats is stats is not None
+    harness.worker._active_filters = ("Gray", "Info")
+    harness.apply(info, harness.set_frame(2))
+    assert info.lines is not lines
@@ -0,0 +1,56 @@
+from types import SimpleNamespace
+from WebCamEnhancer.modules import middleware
+from WebCamEnhancer.modules.middleware import Selfie
+import numpy as np
+
+
+class FakeSegmentation:
+    "Segments green pixels of RGB image like mediapipe returns masks."
+
+    def __init__(self):
+        self.images = []
+
+    def process(self, rgb):
+        self.images.append(rgb.copy())
+        return SimpleNamespace(segmentation_mask=(rgb[..., 1] > 128).astype(np.float32))
+
+
+def make_selfie(monkeypatch, **config):
+    fake = FakeSegmentation()
+    monkeypatch.setattr(middleware, "selfie_segmentation", lambda model_selection=1: fake)
+    selfie = Selfie({**Selfie.CONFIG_TEMPLATE, **config})
+    selfie.prepare((640, 480))
+    return selfie, fake
+
+
+def person_frame():
+    # BGR, person is green rectangle
+    frame = np.zeros((480, 640, 3), np.uint8)
+    frame[...] = (10, 20, 30)
+    frame[120:360, 200:440] = (10, 250, 30)
+    return frame
+
+
+def test_selfie_segments_downscaled_rgb_frame(monkeypatch):
+    selfie, fake = make_selfie(monkeypatch, inference_width=256)
+    frame = person_frame()
+    mask = selfie.compute(frame)
+    image, = fake.images
+    assert image.shape == (192, 256, 3)
+    # converted to RGB
+    assert tuple(image[0, 0]) == (30, 20, 10)
+    # upsampled to the frame and aligned with it (edges can be blurred)
+    assert mask.shape == (480, 640) and mask.dtype == np.float32
+    expected = np.zeros((480, 640), bool)
+    expected[120:360, 200:440] = True
+    assert ((mask > 0.5) != expected).mean() < 0.01
+    assert (mask[125:355, 205:435] > 0.99).all() and (mask[:115] < 0.01).all()
+
+
+def test_selfie_reuses_mask_between_intervals(monkeypatch):
+    selfie, fake = make_selfie(monkeypatch, inference_width=0, inference_interval=3)
+    frame = person_frame()
+    masks = [selfie.compute(frame) for _ in range(5)]
+    # frames 0 and 3 are segmented, at full resolution
+    assert len(fake.images) == 2 and fake.images[0].shape == (480, 640, 3)
+    assert masks[0] is masks[1] is masks[2] and masks[3] is masks[4] and masks[3] is not masks[0]